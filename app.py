@@ -1,5 +1,7 @@
 # Standard library imports
+import json
 import os
+import re
 import traceback
 from collections import namedtuple
 
@@ -413,7 +415,7 @@ class CpenvApplication(sgtk.platform.Application):
         return module_specs
 
     def clear_active_modules(self):
-        self.cpenv.api._active_modules[:] = []
+        self.cpenv.get_active_modules()[:] = []
 
     def activate(self, requirements):
         '''Wraps cpenv.activate'''
@@ -430,6 +432,58 @@ class CpenvApplication(sgtk.platform.Application):
             self.exception('Failed to activate cpenv modules.')
             raise
 
+    def lock(self, module_specs):
+        '''Wraps cpenv.lock'''
+
+        self.debug('Locking %s' % [getattr(m, 'qual_name', m) for m in module_specs])
+        try:
+            return self.cpenv.lock(module_specs)
+        except Exception:
+            self.exception('Failed to lock cpenv modules.')
+            raise
+
+    def is_lockable(self, requirements):
+        '''Returns True when all requirements include a version.'''
+
+        parse = self.cpenv.module.parse_module_requirement
+        return all(parse(requirement)[1] for requirement in requirements)
+
+    def activate_environment(self, env):
+        '''Activate an Environment's modules.
+
+        Modules are activated straight from the Environment's lock when it
+        matches the Environment's requirements. Otherwise requirements are
+        resolved and a new lock is written for the next launch.
+
+        Only Environments whose requirements all include a version are
+        locked. Requirements without a version like "maya" are resolved on
+        every launch so they pick up newly published versions.
+        '''
+
+        requires = self.parse_requires(env['sg_requires'])
+        if not self.is_lockable(requires):
+            return self.activate(requires)
+
+        lock = self.io.read_environment_lock(env)
+        if lock and lock.get('requires') == requires:
+            self.debug('Activating modules from lock...')
+            try:
+                self.clear_active_modules()
+                return self.cpenv.activate_lock(lock)
+            except self.cpenv.StaleLockError as e:
+                self.debug('%s, resolving modules...' % e)
+
+        lock = self.lock(requires)
+        self.io.write_environment_lock(env, lock)
+
+        self.debug('Activating modules...')
+        try:
+            self.clear_active_modules()
+            return self.cpenv.activate_lock(lock)
+        except Exception:
+            self.exception('Failed to activate cpenv modules.')
+            raise
+
     def set_module_paths(self, module_paths):
         '''Set additional paths to use for looking up cpenv modules.'''
 
@@ -524,9 +578,8 @@ class CpenvApplication(sgtk.platform.Application):
             self.debug('Environment %s has no requirements.' % env['code'])
             return
 
-        # Parse Environment requirements
-        requires = self.parse_requires(requires_str)
-        modules = self.activate(requires)
+        # Activate Environment requirements
+        modules = self.activate_environment(env)
         self.debug('Modules: %s' % [m.qual_name for m in modules])
 
 
@@ -839,6 +892,41 @@ class CpenvIO(object):
 
         return list(results)
 
+    def get_environment_lock_path(self, env):
+        '''Get the path to an Environment's lock in the cpenv cache.'''
+
+        site = re.sub(r'[^\w.-]+', '_', self.repo.base_url.split('://')[-1])
+        return self.cpenv.get_cache_path(
+            'locks',
+            '%s_%s_%s.json' % (site, self.environment_entity, env['id']),
+        )
+
+    def read_environment_lock(self, env):
+        '''Read an Environment's lock.
+
+        Returns:
+            dict: Lock data or None if the Environment has not been locked.
+        '''
+
+        lock_path = self.get_environment_lock_path(env)
+        try:
+            with open(lock_path, 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def write_environment_lock(self, env, lock):
+        '''Write an Environment's lock returned by cpenv.lock.'''
+
+        lock_path = self.get_environment_lock_path(env)
+        try:
+            self.cpenv.paths.ensure_path_exists(os.path.dirname(lock_path))
+            with open(lock_path + '.tmp', 'w') as f:
+                json.dump(lock, f)
+            self.cpenv.paths.replace(lock_path + '.tmp', lock_path)
+        except (IOError, OSError):
+            self.app.exception('Failed to write lock %s' % lock_path)
+
     def get_module_spec_sets(self):
         '''Get a list of all the Modules stored in Shotgun.
 
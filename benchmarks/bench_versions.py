@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of version parsing and module sorting.
+
+usage::
+
+    python benchmarks/bench_versions.py
+"""
+from __future__ import print_function
+
+# Standard library imports
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "python"))
+
+# Local imports
+from cpenv import versions  # noqa: E402
+from cpenv.module import ModuleSpec, sort_modules  # noqa: E402
+
+random.seed(0)
+version_strings = []
+for i in range(800):
+    major, minor, patch = [random.randint(0, 20) for _ in range(3)]
+    version_strings.extend(
+        [
+            "%d.%d.%d" % (major, minor, patch),
+            "%d.%d.%d-beta.%d+build%d" % (major, minor, patch, i % 5, i),
+            "%d.%dv%d" % (major, minor, patch),
+            "%d.%d.%d.%d" % (major, minor, patch, i),
+            "v%d" % major,
+        ]
+    )
+
+module_specs = [
+    ModuleSpec(
+        name="module%s" % chr(97 + i % 26),
+        qual_name="module%s-%s" % (chr(97 + i % 26), string),
+        version=versions.parse_version(string),
+        path=None,
+        repo=None,
+    )
+    for i, string in enumerate(version_strings)
+]
+
+
+def parse_uncached():
+    versions._version_cache.clear()
+    for string in version_strings:
+        versions.parse_version(string)
+
+
+def parse_cached():
+    for string in version_strings:
+        versions.parse_version(string)
+
+
+def sort_uncached():
+    for module_spec in module_specs:
+        module_spec.version.__dict__.pop("_sort_key", None)
+    sort_modules(module_specs)
+
+
+def sort_cached():
+    sort_modules(module_specs)
+
+
+def main():
+    print("%d versions, %d module specs" % (len(version_strings), len(module_specs)))
+    for func in (parse_uncached, parse_cached, sort_uncached, sort_cached):
+        # Warm caches before timing the cached variants
+        func()
+        best = min(timeit.repeat(func, number=10, repeat=5)) / 10
+        print("{:<16} {:>8.2f} ms".format(func.__name__, best * 1000))
+
+
+if __name__ == "__main__":
+    main()
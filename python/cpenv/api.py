@@ -3,6 +3,7 @@ from __future__ import absolute_import, print_function
 
 # Standard library imports
 import os
+import threading
 import warnings
 from bisect import bisect
 from collections import OrderedDict
@@ -10,15 +11,24 @@ from collections import OrderedDict
 # Local imports
 from . import compat, hooks, paths, repos
 from .module import Module, ModuleSpec, module_header, sort_modules
-from .resolver import Activator, Copier, Localizer, ResolveError, Resolver
+from .resolver import (
+    Activator,
+    Copier,
+    Localizer,
+    ResolveError,
+    Resolver,
+    StaleLockError,
+)
 from .vendor import appdirs, yaml
 
 __all__ = [
     "activate",
+    "activate_lock",
     "deactivate",
     "clone",
     "create",
     "localize",
+    "lock",
     "publish",
     "resolve",
     "set_home_path",
@@ -44,9 +54,14 @@ __all__ = [
 ]
 _registry = {
     "repos": OrderedDict(),
+    "pending": [],
+    "running": [],
 }
 _active_modules = []
+_init_lock = threading.RLock()
+_path_cache = {}
 missing = object()
+lock_version = 1
 
 
 def resolve(requirements, ignore_unresolved=False):
@@ -96,6 +111,75 @@ def activate(requirements, ignore_unresolved=False):
     return modules
 
 
+def lock(requirements, ignore_unresolved=False):
+    """Resolve a list of module requirements and return a lock.
+
+    A lock is a json serializable dict recording the repo and version of each
+    resolved module. Pass it to activate_lock to activate the same modules
+    without resolving the requirements again.
+
+    Arguments:
+        requirements (List[str]): List of module requirements or ModuleSpecs
+            that have already been resolved.
+    """
+
+    if all([isinstance(r, ModuleSpec) for r in requirements]):
+        module_specs = list(requirements)
+        requirements = [module_spec.qual_name for module_spec in module_specs]
+    else:
+        resolver = Resolver(get_repos())
+        module_specs = resolver.resolve(requirements, ignore_unresolved)
+
+    # Group module_specs by repo so each repo locks it's modules at once
+    repo_specs = OrderedDict()
+    for module_spec in module_specs:
+        repo_specs.setdefault(module_spec.repo, []).append(module_spec)
+
+    locked = {}
+    for repo, specs in repo_specs.items():
+        for module_spec, data in zip(specs, repo.lock(specs)):
+            locked[module_spec.qual_name] = data
+
+    return {
+        "version": lock_version,
+        "requires": list(requirements),
+        "modules": [locked[module_spec.qual_name] for module_spec in module_specs],
+    }
+
+
+def activate_lock(lock):
+    """Activate the modules in a lock returned by :func:`lock`.
+
+    The lock is checked before any modules are activated.
+
+    Raises:
+        StaleLockError when the lock is stale.
+    """
+
+    if lock.get("version") != lock_version:
+        raise StaleLockError("Lock version is not supported.")
+
+    # Group lock data by repo so each repo checks it's modules at once
+    repo_data = OrderedDict()
+    for data in lock["modules"]:
+        repo = get_repo(data["repo"])
+        if not repo:
+            raise StaleLockError("Lock is stale: " + data["qual_name"])
+        repo_data.setdefault(repo, []).append(data)
+
+    unlocked = {}
+    for repo, repo_lock in repo_data.items():
+        for data, module_spec in zip(repo_lock, repo.from_lock_many(repo_lock)):
+            if not module_spec:
+                raise StaleLockError("Lock is stale: " + data["qual_name"])
+            unlocked[data["qual_name"]] = module_spec
+
+    module_specs = [unlocked[data["qual_name"]] for data in lock["modules"]]
+
+    activator = Activator()
+    return activator.activate(module_specs)
+
+
 def activate_environment(environment):
     """Activate an environment by name.
 
@@ -273,6 +357,7 @@ def copy(module, from_repo, to_repo, overwrite=False):
 def get_active_modules():
     """Returns a list of active :class:`Module` s"""
 
+    _init_stage("active_modules")
     return _active_modules
 
 
@@ -283,6 +368,8 @@ def add_active_module(module):
         module (Module): Module to add to CPENV_ACTIVE_MODULES
     """
 
+    _init_stage("active_modules")
+
     if module not in _active_modules:
         _active_modules.append(module)
 
@@ -297,6 +384,8 @@ def remove_active_module(module):
         module (Module): Module to remove from CPENV_ACTIVE_MODULES
     """
 
+    _init_stage("active_modules")
+
     if module in _active_modules:
         _active_modules.remove(module)
 
@@ -310,6 +399,7 @@ def set_home_path(path):
     # Set new home path
     home = paths.normalize(path)
     os.environ["CPENV_HOME"] = home
+    _path_cache.pop("home", None)
     _init_home_path(home)
 
     # Add new LocalRepo
@@ -336,9 +426,24 @@ def get_home_path():
         win - C:/ProgramData/cpenv
         mac - /Library/Application Support/cpenv OR /Library/Caches/cpenv
         linux - /usr/local/share/cpenv OR ~/.local/share/cpenv
+
+    The home directory is looked up once per process and again only when
+    CPENV_HOME changes or set_home_path is called.
     """
 
     home = os.getenv("CPENV_HOME")
+    cached = _path_cache.get("home")
+    if cached and cached[0] == home:
+        return cached[1]
+
+    home_path = _find_home_path(home)
+    _path_cache["home"] = (home, home_path)
+    return home_path
+
+
+def _find_home_path(home):
+    """Find a writable home directory, preferring the CPENV_HOME value home."""
+
     if home and paths.is_writable(home):
         if paths.is_writable(home):
             return home
@@ -406,10 +511,11 @@ def get_user_path():
         linux - ~/.local/share/cpenv
     """
 
-    user_default = appdirs.user_data_dir("cpenv", appauthor=False)
-    user = paths.normalize(user_default)
+    if "user" not in _path_cache:
+        user_default = appdirs.user_data_dir("cpenv", appauthor=False)
+        _path_cache["user"] = paths.normalize(user_default)
 
-    return user
+    return _path_cache["user"]
 
 
 def get_user_modules_path():
@@ -488,6 +594,7 @@ def get_modules(*requirements):
 def update_repo(repo):
     """Update a registered repo."""
 
+    _init_stage("repos")
     _registry["repos"].update({repo.name: repo})
 
 
@@ -501,6 +608,8 @@ def add_repo(repo, priority=None):
     if priority is not None:
         repo.priority = priority
 
+    _init_stage("repos")
+
     if repo.name not in _registry["repos"]:
         repos = list(_registry["repos"].values())
         insert_idx = bisect([r.priority for r in repos], repo.priority)
@@ -514,6 +623,7 @@ def add_repo(repo, priority=None):
 def remove_repo(repo):
     """Unregister a Repo."""
 
+    _init_stage("repos")
     _registry["repos"].pop(repo.name, None)
 
 
@@ -533,6 +643,7 @@ def get_repo(name, **query):
 def get_repos():
     """Get a list of all registered Repos."""
 
+    _init_stage("repos")
     return list(_registry["repos"].values())
 
 
@@ -595,13 +706,43 @@ def write_config(*args):
 
 
 def _init():
-    """Responsible for initially configuraing cpenv."""
+    """Responsible for initially configuraing cpenv.
+
+    Repos and active modules are initialized in stages on first use, so
+    importing cpenv does not touch the filesystem.
+    """
+
+    _registry["pending"][:] = ["repos", "active_modules"]
+
+
+def _init_stage(stage):
+    """Run an initialization stage if it has not already run.
+
+    A stage is only marked done once it succeeds, so a stage that raises is
+    retried on next use. Stages use the api themselves, so calls made while a
+    stage is running do not run it again.
+    """
+
+    with _init_lock:
+        if stage not in _registry["pending"] or stage in _registry["running"]:
+            return
+
+        _registry["running"].append(stage)
+        try:
+            _init_stages[stage]()
+            _registry["pending"].remove(stage)
+        finally:
+            _registry["running"].remove(stage)
+
+
+def _init_repos():
+    """Create cpenv home and user folders and register repos."""
 
     _init_home_path(get_home_path())
     _init_user_path(get_user_path())
 
     # Register builtin repos
-    cwd = repos.LocalRepo("cwd", paths.normalize(os.getcwd()))
+    cwd = repos.LocalRepo("cwd", paths.normalize(os.getcwd()), index=False)
     user = repos.LocalRepo("user", get_user_modules_path())
     home = repos.LocalRepo("home", get_home_modules_path())
     if cwd.path == home.path == user.path:
@@ -641,17 +782,27 @@ def _init():
                 )
             )
 
-    # Set _active_modules from CPENV_ACTIVE_MODULES
+
+def _init_active_modules():
+    """Set _active_modules from CPENV_ACTIVE_MODULES."""
+
+    resolved = []
     unresolved = []
     resolver = Resolver(get_repos())
     active_modules = os.getenv("CPENV_ACTIVE_MODULES", "").split(os.pathsep)
     for module in active_modules:
         if module:
             try:
-                resolved = resolver.resolve([module])[0]
-                _active_modules.append(resolved)
+                resolved.append(resolver.resolve([module])[0])
             except ResolveError:
                 unresolved.append(module)
+    _active_modules.extend(resolved)
 
     if unresolved:
         warnings.warn("Unable to resolve %s from $CPENV_ACTIVE_MODULES:" % unresolved)
+
+
+_init_stages = {
+    "repos": _init_repos,
+    "active_modules": _init_active_modules,
+}
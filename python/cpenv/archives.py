@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Content addressed storage of module archives.
+
+Archives downloaded from remote Repos are stored by key, so localizing the
+same module again only requires extracting the stored archive. Set
+CPENV_ARCHIVE_CACHE to store archives in a location shared by multiple
+cpenv homes and CPENV_ARCHIVE_CACHE_SIZE to the maximum size of the store in
+megabytes. A size of 0 disables the store.
+"""
+
+# Standard library imports
+import errno
+import os
+import re
+import shutil
+import uuid
+
+# Local imports
+from . import paths
+
+default_max_size = 10240  # megabytes
+
+
+class ArchiveStore(object):
+    """Stores archives by key evicting the least recently used archives when
+    the combined size of all archives exceeds max_size.
+
+    Arguments:
+        root (str): Directory to store archives in.
+        max_size (int): Maximum combined size of archives in bytes.
+    """
+
+    def __init__(self, root, max_size):
+        self.root = paths.normalize(root)
+        self.max_size = max_size
+
+    def __repr__(self):
+        return "<{}>(root={!r}, max_size={!r})".format(
+            self.__class__.__name__,
+            self.root,
+            self.max_size,
+        )
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def path(self, key):
+        """Return the path an archive is stored at."""
+
+        return paths.normalize(self.root, re.sub(r"[^\w.-]+", "_", key) + ".zip")
+
+    def get(self, key, size=None):
+        """Return the path to an archive or None if it is not stored.
+
+        Arguments:
+            key (str): Key of the archive.
+            size (int): Expected size of the archive in bytes.
+        """
+
+        if not self.enabled:
+            return
+
+        archive_path = self.path(key)
+        try:
+            if size is not None and os.path.getsize(archive_path) != size:
+                return
+            # Bump mtime so eviction removes the least recently used archives
+            os.utime(archive_path, None)
+        except OSError:
+            return
+
+        return archive_path
+
+    def add(self, key, file):
+        """Move a file into the store and evict old archives.
+
+        When the store is on another filesystem the file is copied to a
+        temporary file in the store and renamed into place.
+
+        Returns:
+            Path to the stored archive.
+        """
+
+        paths.ensure_path_exists(self.root)
+        archive_path = self.path(key)
+        try:
+            paths.replace(file, archive_path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+
+            tmp_path = archive_path + "." + uuid.uuid4().hex[:8]
+            try:
+                shutil.copyfile(file, tmp_path)
+                paths.replace(tmp_path, archive_path)
+            finally:
+                if os.path.isfile(tmp_path):
+                    os.remove(tmp_path)
+            os.remove(file)
+
+        self.evict(keep=archive_path)
+        return archive_path
+
+    def evict(self, keep=None):
+        """Remove least recently used archives until the store fits in
+        max_size."""
+
+        archives = []
+        for name in os.listdir(self.root):
+            archive_path = paths.normalize(self.root, name)
+            if archive_path == keep or not name.endswith(".zip"):
+                continue
+            try:
+                stat = os.stat(archive_path)
+            except OSError:
+                continue
+            archives.append((stat.st_mtime, stat.st_size, archive_path))
+
+        size = sum([archive[1] for archive in archives])
+        if keep and os.path.isfile(keep):
+            size += os.path.getsize(keep)
+
+        for _, archive_size, archive_path in sorted(archives):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(archive_path)
+                size -= archive_size
+            except OSError:
+                # Archive may be in use on windows
+                pass
+
+
+def get_store():
+    """Returns the ArchiveStore configured by CPENV_ARCHIVE_CACHE and
+    CPENV_ARCHIVE_CACHE_SIZE."""
+
+    from .api import get_cache_path
+
+    root = os.getenv("CPENV_ARCHIVE_CACHE") or get_cache_path("archives")
+    try:
+        max_size = int(os.getenv("CPENV_ARCHIVE_CACHE_SIZE", default_max_size))
+    except ValueError:
+        max_size = default_max_size
+
+    return ArchiveStore(root, max_size * 1024 * 1024)
@@ -21,6 +21,7 @@ class Repo(core.CLI):
             AddRepo(self),
             RemoveRepo(self),
             EditRepos(self),
+            ReindexRepo(self),
         ]
 
 
@@ -184,3 +185,37 @@ class EditRepos(core.CLI):
         editor = os.getenv("CPENV_EDITOR", os.getenv("EDITOR", "subl"))
         core.echo("Opening %s in %s." % (config_path, editor))
         shell.run(editor, config_path)
+
+
+class ReindexRepo(core.CLI):
+    """Rebuild the module index of local repos.
+
+    Run this after editing a module.yml in place.
+    """
+
+    name = "reindex"
+
+    def setup_parser(self, parser):
+        parser.add_argument(
+            "name",
+            help="Name of the repo. Defaults to all local repos.",
+            nargs="?",
+        )
+
+    def run(self, args):
+        core.echo()
+        local_repos = [
+            repo
+            for repo in api.get_repos()
+            if isinstance(repo, repos.LocalRepo)
+            and (not args.name or repo.name == args.name)
+        ]
+        if args.name and not local_repos:
+            core.echo("Error: Local repo named %s not found." % args.name)
+            core.exit(1)
+
+        for repo in local_repos:
+            core.echo("- Reindexing %s..." % repo.name, end="")
+            repo.reindex()
+            core.echo("OK!")
+        core.echo()
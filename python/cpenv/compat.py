@@ -2,6 +2,7 @@
 
 # Standard library imports
 import os
+import stat
 import sys
 
 py_ver = sys.version_info[0]
@@ -25,3 +26,42 @@ os.environ["CPENV_PLATFORM"] = platform
 
 # Leave osx in supported platforms for backwards compatability
 supported_platforms = ["win", "linux", "mac", "osx"]
+
+
+class DirEntry(object):
+    """Minimal os.DirEntry used when os.scandir is unavailable."""
+
+    def __init__(self, root, name):
+        self.name = name
+        self.path = os.path.join(root, name)
+        self._lstat = None
+
+    def stat(self, follow_symlinks=True):
+        if follow_symlinks:
+            return os.stat(self.path)
+        if self._lstat is None:
+            self._lstat = os.lstat(self.path)
+        return self._lstat
+
+    def is_symlink(self):
+        return stat.S_ISLNK(self.stat(follow_symlinks=False).st_mode)
+
+    def is_dir(self, follow_symlinks=True):
+        try:
+            return stat.S_ISDIR(self.stat(follow_symlinks).st_mode)
+        except OSError:
+            return False
+
+    def is_file(self, follow_symlinks=True):
+        try:
+            return stat.S_ISREG(self.stat(follow_symlinks).st_mode)
+        except OSError:
+            return False
+
+
+if hasattr(os, "scandir"):
+    scandir = os.scandir
+else:
+
+    def scandir(path):
+        return [DirEntry(path, name) for name in os.listdir(path)]
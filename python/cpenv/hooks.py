@@ -2,12 +2,27 @@
 from __future__ import absolute_import, print_function
 
 # Standard library imports
+import hashlib
+import marshal
 import os
+import struct
+import sys
+import uuid
 from types import ModuleType
 
 # Local imports
 from . import paths
 
+# Hook names found in each hook path, validated against the path's mtime so
+# looking up missing hooks only costs a stat of the hook path.
+_hook_dirs = {}
+
+# Compiled hook code by path, validated against the hook file's mtime and size
+_hook_code = {}
+
+# Header of bytecode cache files - mtime and size of the compiled hook file
+_header = struct.Struct("<dq")
+
 
 class HookFinder(object):
     """Find python hooks by name in the provided path.
@@ -24,9 +39,8 @@ class HookFinder(object):
 
     def _find_pyfile(self, hook_name):
         for path in self.hook_paths:
-            hook_path = paths.normalize(path, hook_name + ".py")
-            if os.path.exists(hook_path):
-                return hook_path
+            if hook_name in list_hooks(path):
+                return paths.normalize(path, hook_name + ".py")
 
     def find(self, hook_name):
 
@@ -36,12 +50,14 @@ class HookFinder(object):
             return
 
         try:
-            with open(hook_path, "r") as f:
-                code = compile(f.read(), "", "exec")
+            code = get_hook_code(hook_path)
         except SyntaxError as e:
             print("SyntaxError compiling hook: {}".format(e))
             raise
 
+        if code is None:
+            return
+
         hook = ModuleType(hook_name)
         hook.__file__ = hook_path
 
@@ -55,6 +71,116 @@ class HookFinder(object):
     __call__ = find
 
 
+def list_hooks(hook_path):
+    """Returns the names of the hooks in a directory.
+
+    The listing is cached until the directory's mtime changes, which happens
+    when hooks are added, removed or the directory is replaced.
+    """
+
+    try:
+        mtime = os.stat(hook_path).st_mtime
+    except OSError:
+        return frozenset()
+
+    cached = _hook_dirs.get(hook_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    try:
+        hooks = frozenset(
+            [name[:-3] for name in os.listdir(hook_path) if name.endswith(".py")]
+        )
+    except OSError:
+        hooks = frozenset()
+
+    _hook_dirs[hook_path] = (mtime, hooks)
+    return hooks
+
+
+def get_hook_code(hook_path):
+    """Returns the compiled code of a hook file.
+
+    Code is cached in process and in the cpenv cache directory, so a hook is
+    only compiled again when its mtime or size changes. Returns None if the
+    hook file no longer exists.
+    """
+
+    try:
+        stat = os.stat(hook_path)
+    except OSError:
+        return
+
+    header = _header.pack(stat.st_mtime, stat.st_size)
+    cached = _hook_code.get(hook_path)
+    if cached and cached[0] == header:
+        return cached[1]
+
+    cache_path = get_hook_cache_path(hook_path)
+    code = read_hook_cache(cache_path, header)
+    if code is None:
+        with open(hook_path, "r") as f:
+            code = compile(f.read(), "", "exec")
+        write_hook_cache(cache_path, header, code)
+
+    _hook_code[hook_path] = (header, code)
+    return code
+
+
+def get_hook_cache_path(hook_path):
+    """Returns the path to the bytecode cache of a hook file.
+
+    Marshalled code is specific to the python version, so the version is
+    part of the cache key.
+    """
+
+    from .api import get_cache_path
+
+    key = hook_path + "|" + sys.version
+    name = hashlib.sha1(key.encode("utf-8")).hexdigest() + ".bin"
+    return get_cache_path("hooks", name)
+
+
+def read_hook_cache(cache_path, header):
+    """Read cached code, returns None if the cache is missing or stale."""
+
+    try:
+        with open(cache_path, "rb") as f:
+            data = f.read()
+    except (IOError, OSError):
+        return
+
+    if data[: _header.size] != header:
+        return
+
+    try:
+        return marshal.loads(data[_header.size :])
+    except (EOFError, ValueError, TypeError):
+        return
+
+
+def write_hook_cache(cache_path, header, code):
+    """Write code to the bytecode cache. Fails silently as the cache is only an
+    optimization."""
+
+    tmp_path = cache_path + "." + uuid.uuid4().hex[:8]
+    try:
+        paths.ensure_path_exists(os.path.dirname(cache_path))
+        with open(tmp_path, "wb") as f:
+            f.write(header + marshal.dumps(code))
+        paths.replace(tmp_path, cache_path)
+    except (IOError, OSError, ValueError):
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
+
+
+def clear_hook_cache():
+    """Clear the in process hook caches."""
+
+    _hook_dirs.clear()
+    _hook_code.clear()
+
+
 def get_global_hook_path():
     """Returns the global hook path"""
 
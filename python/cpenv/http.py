@@ -1,22 +1,554 @@
 # -*- coding: utf-8 -*-
 # Standard library imports
 import os
+import socket
 import ssl
+import threading
+from json import dumps as json_dump
 from json import loads as json_load
 
 try:
-    from urllib2 import urlopen, HTTPError, URLError
-    from httplib import HTTPException
+    from urllib2 import urlopen, HTTPError, Request, URLError
+    from httplib import HTTPConnection, HTTPException, HTTPSConnection
+    from urllib import getproxies, proxy_bypass
+    from urlparse import urljoin, urlsplit
 except ImportError:
-    from urllib.request import urlopen
+    from http.client import HTTPConnection, HTTPException, HTTPSConnection
+    from urllib.error import HTTPError
+    from urllib.parse import urljoin, urlsplit
+    from urllib.request import Request, getproxies, proxy_bypass, urlopen
 
+# Seconds to wait for a connection or response when CPENV_HTTP_TIMEOUT is unset
+default_timeout = 60
+max_redirects = 10
+redirect_codes = (301, 302, 303, 307, 308)
 
-def get(url):
-    """Make a get request."""
+_ssl_context = None
+_ssl_context_lock = threading.Lock()
 
-    context = ssl.create_default_context(cafile=ca_certs())
-    response = urlopen(url, context=context)
-    return response
+
+def get(url, headers=None, timeout=None):
+    """Make a get request.
+
+    Connections are kept alive and reused from a pool of connections per host.
+    Requests made through a proxy configured in the environment use urlopen.
+
+    Arguments:
+        url (str): Url to request.
+        headers (dict): Request headers. Cookie and Authorization headers are
+            not sent when redirected to another host.
+        timeout (float): Seconds to wait for a connection or response.
+            Defaults to $CPENV_HTTP_TIMEOUT or 60.
+
+    Returns:
+        Response
+    """
+
+    timeout = timeout or get_timeout()
+    headers = dict(headers or {})
+    headers.setdefault("User-Agent", "cpenv")
+
+    for _ in range(max_redirects + 1):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or use_proxy(parts):
+            return urlopen(
+                Request(url, headers=headers),
+                context=get_ssl_context(),
+                timeout=timeout,
+            )
+
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        response, release = _pool.request(
+            parts.scheme,
+            parts.netloc,
+            path,
+            headers,
+            timeout,
+        )
+        location = response.getheader("Location")
+        if response.status in redirect_codes and location:
+            response.read()
+            release(response)
+            redirect_url = urljoin(url, location)
+            if urlsplit(redirect_url).netloc != parts.netloc:
+                headers = dict(
+                    [
+                        (k, v)
+                        for k, v in headers.items()
+                        if k.lower() not in ("authorization", "cookie")
+                    ]
+                )
+            url = redirect_url
+            continue
+
+        if response.status >= 400:
+            response.read()
+            release(response)
+            raise HTTPError(url, response.status, response.reason, response.msg, None)
+
+        return Response(url, response, release)
+
+    raise HTTPError(url, response.status, "Too many redirects", response.msg, None)
+
+
+class Response(object):
+    """File-like response returned by get.
+
+    Closing a response that was read to the end returns its connection to the
+    pool, otherwise the connection is closed.
+    """
+
+    def __init__(self, url, response, release):
+        self.url = url
+        self._response = response
+        self._release = release
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def getcode(self):
+        return self._response.status
+
+    def geturl(self):
+        return self.url
+
+    def info(self):
+        return self._response.msg
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            return self._response.read()
+        return self._response.read(n)
+
+    def close(self):
+        release, self._release = self._release, None
+        if release:
+            release(self._response)
+
+
+class ConnectionPool(object):
+    """Thread-safe pool of keep-alive connections keyed by scheme and host.
+
+    Arguments:
+        max_idle (int): Maximum number of idle connections kept per host.
+    """
+
+    def __init__(self, max_idle=8):
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def request(self, scheme, netloc, path, headers, timeout):
+        """Send a GET request on a pooled connection.
+
+        A request on a reused connection is retried once on a new connection
+        as the server may have closed it while it was idle.
+
+        Returns:
+            Tuple containing an HTTPResponse and a function that releases the
+            connection when called with the response.
+        """
+
+        key = (scheme, netloc)
+        for retry in (True, False):
+            connection = self._acquire(key, timeout)
+            reused = connection.sock is not None
+            try:
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+            except (HTTPException, socket.error):
+                connection.close()
+                if reused and retry:
+                    continue
+                raise
+
+            def release(response, connection=connection):
+                if response.isclosed() and not response.will_close:
+                    self._release(key, connection)
+                else:
+                    connection.close()
+
+            return response, release
+
+    def clear(self):
+        """Close all idle connections."""
+
+        with self._lock:
+            idle, self._idle = self._idle, {}
+
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def _acquire(self, key, timeout):
+        with self._lock:
+            connections = self._idle.get(key)
+            if connections:
+                connection = connections.pop()
+                connection.timeout = timeout
+                if connection.sock:
+                    connection.sock.settimeout(timeout)
+                return connection
+
+        scheme, netloc = key
+        if scheme == "https":
+            return HTTPSConnection(netloc, timeout=timeout, context=get_ssl_context())
+        return HTTPConnection(netloc, timeout=timeout)
+
+    def _release(self, key, connection):
+        with self._lock:
+            connections = self._idle.setdefault(key, [])
+            if len(connections) < self.max_idle:
+                connections.append(connection)
+                return
+
+        connection.close()
+
+
+_pool = ConnectionPool()
+
+
+def get_ssl_context():
+    """Returns an SSL context using the vendored certifi/cacert.pem.
+
+    The context is created once and shared by all requests.
+    """
+
+    global _ssl_context
+    with _ssl_context_lock:
+        if _ssl_context is None:
+            _ssl_context = ssl.create_default_context(cafile=ca_certs())
+    return _ssl_context
+
+
+def get_timeout():
+    """Seconds to wait for a connection or response from $CPENV_HTTP_TIMEOUT."""
+
+    try:
+        return float(os.getenv("CPENV_HTTP_TIMEOUT", default_timeout))
+    except ValueError:
+        return default_timeout
+
+
+def use_proxy(parts):
+    """Returns True when a request should be made through a proxy configured in
+    the environment."""
+
+    return parts.scheme in getproxies() and not proxy_bypass(parts.hostname or "")
+
+
+def download(
+    url,
+    where,
+    chunk_size=1048576,
+    progress_cb=None,
+    connections=4,
+    part_size=8388608,
+):
+    """Download the response of a get request to a file.
+
+    When the server supports Range requests the file is split into parts that
+    are downloaded concurrently into a preallocated file. Completed parts are
+    recorded in a <where>.parts file along with the ETag or Last-Modified
+    validator of the resource, so an interrupted download resumes where it
+    left off. Parts are requested using If-Range, so parts of a resource that
+    changed are never combined. Servers without Range support fall back to a
+    single stream.
+
+    Arguments:
+        url (str): Url to download.
+        where (str): Path to output file.
+        chunk_size (int): Number of bytes to read and write at a time.
+        progress_cb (callable): Called with the number of bytes downloaded.
+        connections (int): Maximum number of concurrent connections.
+        part_size (int): Size in bytes of each Range request.
+
+    Returns:
+        Path to the output file.
+    """
+
+    # Probe for Range support and the size of the resource using one byte
+    try:
+        response = get(url, {"Range": "bytes=0-0"})
+    except HTTPError as e:
+        if e.code != 416:
+            raise
+        # Range not satisfiable - most likely an empty file
+        response = get(url)
+
+    size = get_range_size(response)
+    if size is None and response.getcode() == 206:
+        # Partial content of an unknown size - start over without a range
+        response.close()
+        response = get(url)
+
+    if size is None:
+        try:
+            with open(where, "wb") as f:
+                _write_stream(response, f, chunk_size, progress_cb)
+        finally:
+            response.close()
+        return where
+
+    response.read()
+    response.close()
+
+    # Use the final url for the parts in case we were redirected
+    url = response.geturl()
+    validator = get_validator(response)
+    state_path = where + ".parts"
+    parts = [
+        (start, min(start + part_size, size) - 1)
+        for start in range(0, size, part_size)
+    ]
+    done = set()
+    if os.path.isfile(where) and os.path.getsize(where) == size:
+        done = _read_parts_state(state_path, size, part_size, validator)
+    else:
+        with open(where, "wb") as f:
+            f.truncate(size)
+
+    lock = threading.Lock()
+
+    def mark_done(start):
+        with lock:
+            done.add(start)
+            _write_parts_state(state_path, size, part_size, validator, done)
+
+    if progress_cb and done:
+        progress_cb(sum([end - start + 1 for start, end in parts if start in done]))
+
+    def download_part(part):
+        start, end = part
+        headers = {"Range": "bytes=%d-%d" % (start, end)}
+        if validator:
+            headers["If-Range"] = validator
+        response = get(url, headers)
+        try:
+            if response.getcode() != 206:
+                # Servers respond with the full resource when it no longer
+                # matches If-Range.
+                raise IOError("Server ignored Range request or %s changed" % url)
+            with open(where, "r+b") as f:
+                f.seek(start)
+                _write_stream(response, f, chunk_size)
+        finally:
+            response.close()
+        mark_done(start)
+        return end - start + 1
+
+    remaining = [part for part in parts if part[0] not in done]
+    if remaining:
+        from multiprocessing.pool import ThreadPool
+
+        pool = ThreadPool(min(connections, len(remaining)))
+        try:
+            # Report progress from this thread as progress callbacks may
+            # update UI elements.
+            for downloaded in pool.imap_unordered(download_part, remaining):
+                if progress_cb:
+                    progress_cb(downloaded)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    if os.path.isfile(state_path):
+        os.remove(state_path)
+
+    return where
+
+
+def get_range_size(response):
+    """Get the full size of a resource from a partial content response.
+
+    Returns None when the response is not partial content or the size is
+    unknown.
+    """
+
+    if response.getcode() != 206:
+        return
+
+    content_range = response.info().get("Content-Range", "")
+    total = content_range.rsplit("/", 1)[-1].strip()
+    if not total.isdigit():
+        return
+
+    return int(total)
+
+
+def get_validator(response):
+    """Get a validator of a response that can be sent in an If-Range header.
+
+    Returns the ETag of the response unless it is weak, otherwise the
+    Last-Modified date. Returns None when the response has neither.
+    """
+
+    info = response.info()
+    etag = info.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return info.get("Last-Modified")
+
+
+class RangeFile(object):
+    """Read-only seekable file object that reads a url using Range requests.
+
+    Data is fetched in blocks of at least block_size bytes. Allows reading
+    parts of a remote zip archive with zipfile.ZipFile.
+
+    Arguments:
+        url (str): Url to read.
+        size (int): Size in bytes of the resource.
+        block_size (int): Minimum number of bytes to request at a time.
+        progress_cb (callable): Called with the number of bytes downloaded.
+    """
+
+    def __init__(self, url, size, block_size=1048576, progress_cb=None):
+        self.url = url
+        self.size = size
+        self.block_size = block_size
+        self.progress_cb = progress_cb
+        self._pos = 0
+        self._block_start = 0
+        self._block = b""
+
+    @classmethod
+    def open(cls, url, block_size=1048576, progress_cb=None):
+        """Open a RangeFile for url.
+
+        Returns None when the server does not support Range requests.
+        """
+
+        # Request the last block first as that is where zip archives store
+        # their central directory.
+        try:
+            response = get(url, {"Range": "bytes=-%d" % block_size})
+        except HTTPError as e:
+            if e.code != 416:
+                raise
+            return
+
+        try:
+            size = get_range_size(response)
+            if size is None:
+                return
+            range_file = cls(response.geturl(), size, block_size, progress_cb)
+            range_file._block = response.read()
+            range_file._block_start = size - len(range_file._block)
+        finally:
+            response.close()
+
+        if progress_cb:
+            progress_cb(len(range_file._block))
+
+        return range_file
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def writable(self):
+        return False
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self._pos
+        elif whence == 2:
+            offset += self.size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            n = self.size - self._pos
+        start = self._pos
+        end = min(start + n, self.size)
+        if end <= start:
+            return b""
+
+        block_end = self._block_start + len(self._block)
+        if start < self._block_start or end > block_end:
+            self._fetch(start, max(end, start + self.block_size))
+
+        offset = start - self._block_start
+        self._pos = end
+        return self._block[offset : offset + end - start]
+
+    def _fetch(self, start, end):
+        end = min(end, self.size)
+        response = get(self.url, {"Range": "bytes=%d-%d" % (start, end - 1)})
+        try:
+            if response.getcode() != 206:
+                raise IOError("Server ignored Range request for %s" % self.url)
+            self._block = response.read()
+            self._block_start = start
+        finally:
+            response.close()
+
+        if self.progress_cb:
+            self.progress_cb(len(self._block))
+
+    def close(self):
+        self._block = b""
+
+
+def _write_stream(response, f, chunk_size, progress_cb=None):
+    while True:
+        chunk = response.read(chunk_size)
+        if not chunk:
+            break
+        f.write(chunk)
+        if progress_cb:
+            progress_cb(len(chunk))
+
+
+def _read_parts_state(state_path, size, part_size, validator):
+    # Parts of a resource without a validator may be from an older version
+    if not validator:
+        return set()
+
+    try:
+        with open(state_path, "r") as f:
+            state = json_load(f.read())
+    except (IOError, OSError, ValueError):
+        return set()
+
+    if (
+        state.get("size") != size
+        or state.get("part_size") != part_size
+        or state.get("validator") != validator
+    ):
+        return set()
+
+    return set(state.get("done", []))
+
+
+def _write_parts_state(state_path, size, part_size, validator, done):
+    state = {
+        "size": size,
+        "part_size": part_size,
+        "validator": validator,
+        "done": sorted(done),
+    }
+    with open(state_path, "w") as f:
+        f.write(json_dump(state))
 
 
 def json(response):
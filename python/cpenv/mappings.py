@@ -3,6 +3,7 @@ from __future__ import absolute_import, print_function
 
 # Standard library imports
 import collections
+import logging
 import os
 import random
 import sys
@@ -20,6 +21,8 @@ except ImportError:
     from collections import Mapping, MutableMapping, Sequence
 
 
+_log = logging.getLogger(__name__)
+_template_pattern = Template.pattern
 env_value_types = numeric_types + string_types
 Item = collections.namedtuple("Item", "key value")
 Op = collections.namedtuple("Op", "key value op")
@@ -92,8 +95,38 @@ class EnvironmentDict(CaseInsensitiveDict):
 
     def __init__(self, *args, **kwargs):
         self._add_condition = kwargs.pop("add_condition", ignore_case)
+        self._lower_values = {}
         super(EnvironmentDict, self).__init__(*args, **kwargs)
 
+    def __setitem__(self, key, value):
+        self._lower_values.pop(key.lower(), None)
+        super(EnvironmentDict, self).__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._lower_values.pop(key.lower(), None)
+        super(EnvironmentDict, self).__delitem__(key)
+
+    def _get_lower_values(self, key, result):
+        """Get a set of the lowercase values of a key.
+
+        The set is kept up to date by append and prepend so checking if a value
+        can be added does not require lowercasing every item of a key.
+        """
+
+        lower_values = self._lower_values.get(key.lower())
+        if lower_values is None:
+            lower_values = set([item.lower() for item in result])
+        return lower_values
+
+    def _can_add(self, result, lower_values, value):
+        if self._add_condition is ignore_case:
+            return value.lower() not in lower_values
+        return self._add_condition(result, value)
+
+    def _set_list(self, key, result, lower_values):
+        self[key] = result
+        self._lower_values[key.lower()] = lower_values
+
     def _get_list(self, key):
         value = self.get(key, None)
         if value is None:
@@ -147,6 +180,8 @@ class EnvironmentDict(CaseInsensitiveDict):
                 if self._remove_condition(result, v):
                     result.remove(v)
 
+        # Setting the key discards it's lowercase values, they are rebuilt by
+        # the next append or prepend.
         if not result:
             self.pop(key, None)
         else:
@@ -159,17 +194,20 @@ class EnvironmentDict(CaseInsensitiveDict):
         """
 
         result = self._get_list(key)
+        lower_values = self._get_lower_values(key, result)
         value = self._coerce_value(value)
 
         if isinstance(value, env_value_types):
-            if self._add_condition(result, value):
+            if self._can_add(result, lower_values, value):
                 result.insert(0, value)
+                lower_values.add(value.lower())
         elif isinstance(value, Sequence):
             for v in value:
-                if self._add_condition(result, v):
+                if self._can_add(result, lower_values, v):
                     result.insert(0, v)
+                    lower_values.add(v.lower())
 
-        self[key] = result
+        self._set_list(key, result, lower_values)
 
     def append(self, key, value, add_check=None):
         """Append a value to a key.
@@ -178,17 +216,20 @@ class EnvironmentDict(CaseInsensitiveDict):
         """
 
         result = self._get_list(key)
+        lower_values = self._get_lower_values(key, result)
         value = self._coerce_value(value)
 
         if isinstance(value, env_value_types):
-            if self._add_condition(result, value):
+            if self._can_add(result, lower_values, value):
                 result.append(value)
+                lower_values.add(value.lower())
         elif isinstance(value, Sequence):
             for v in value:
-                if self._add_condition(result, v):
+                if self._can_add(result, lower_values, v):
                     result.append(v)
+                    lower_values.add(v.lower())
 
-        self[key] = result
+        self._set_list(key, result, lower_values)
 
 
 class EnvironmentDictTokenizer(object):
@@ -380,21 +421,89 @@ def dict_to_env(d, pathsep=os.pathsep):
     return out_env
 
 
+def substitute(value, *mappings):
+    """Like Template.safe_substitute but looks up variables in a sequence of
+    mappings. Reuses the compiled Template pattern."""
+
+    def convert(match):
+        name = match.group("named") or match.group("braced")
+        if name is not None:
+            for mapping in mappings:
+                if name in mapping:
+                    return str(mapping[name])
+            return match.group()
+        if match.group("escaped") is not None:
+            return Template.delimiter
+        return match.group()
+
+    return _template_pattern.sub(convert, value)
+
+
+def get_references(value, env):
+    """Get the names of the variables in env referenced by value."""
+
+    references = []
+    for match in _template_pattern.finditer(value):
+        name = match.group("named") or match.group("braced")
+        if name is not None and name in env and name not in references:
+            references.append(name)
+    return references
+
+
+def sort_envvars(env):
+    """Order the variables in an environment dict so that every variable comes
+    after the variables it references.
+
+    Returns:
+        tuple: (ordered keys, list of (key, reference) pairs forming cycles)
+    """
+
+    references = {k: get_references(v, env) for k, v in env.items()}
+    order = []
+    cycles = []
+    visiting, visited = set(), set()
+    for root in references:
+        if root in visited:
+            continue
+
+        visiting.add(root)
+        stack = [(root, iter(references[root]))]
+        while stack:
+            key, refs = stack[-1]
+            for ref in refs:
+                if ref in visiting:
+                    cycles.append((key, ref))
+                elif ref not in visited:
+                    visiting.add(ref)
+                    stack.append((ref, iter(references[ref])))
+                    break
+            else:
+                stack.pop()
+                visiting.discard(key)
+                visited.add(key)
+                order.append(key)
+
+    return order, cycles
+
+
 def expand_envvars(env):
     """
     Expand all environment variables in an environment dict
 
+    Variables are expanded once in dependency order, so chains of references
+    of any depth are fully expanded. References forming a cycle are logged
+    and substituted with the unexpanded value of the referenced variable.
+
     :param env: Environment dict
     """
 
-    out_env = {}
+    order, cycles = sort_envvars(env)
+    for key, ref in cycles:
+        _log.debug("Cyclic reference to $%s in $%s.", ref, key)
 
-    for k, v in env.items():
-        out_env[k] = Template(v).safe_substitute(env)
-
-    # Expand twice to make sure we expand everything we possibly can
-    for k, v in out_env.items():
-        out_env[k] = Template(v).safe_substitute(out_env)
+    out_env = {}
+    for key in order:
+        out_env[key] = substitute(env[key], out_env, env)
 
     return out_env
 
@@ -2,23 +2,34 @@
 from __future__ import absolute_import, print_function
 
 # Standard library imports
+import logging
 import os
 import sys
+from bisect import bisect_left, bisect_right
 from collections import namedtuple
-from string import Template
 
 # Local imports
-from . import compat, paths
+from . import compat, mappings, paths
 from .hooks import HookFinder, get_global_hook_path
 from .vendor import yaml
 from .versions import ParseError, Version, default_version, parse_version
 
+_log = logging.getLogger(__name__)
+
 __all__ = [
     "Module",
     "ModuleSpec",
 ]
 
 
+# Loader used by load_yaml, set on first use by get_yaml_loader
+_yaml_loader = None
+
+# Parsed module.yml files by path, cleared when it reaches max_cached_configs
+_config_cache = {}
+max_cached_configs = 4096
+
+
 module_header = """
 # Variables
 # $MODULE - path to this module
@@ -48,12 +59,9 @@ class Module(object):
         else:
             self.repo = repo
 
-        # Create HookFinder for this module
+        # HookFinder for this module is created when a hook is first run
         self.hook_path = self.relative_path("hooks")
-        self.hook_finder = HookFinder(
-            self.hook_path,
-            get_global_hook_path(),
-        )
+        self._hook_finder = None
 
         # Setup config
         self.config_path = self.relative_path("module.yml")
@@ -135,6 +143,15 @@ class Module(object):
 
         return paths.normalize(self.path, *args)
 
+    @property
+    def hook_finder(self):
+        if self._hook_finder is None:
+            self._hook_finder = HookFinder(
+                self.hook_path,
+                get_global_hook_path(),
+            )
+        return self._hook_finder
+
     def run_hook(self, hook_name):
         """Run a module hook by name, fallback to global hook location."""
 
@@ -186,15 +203,7 @@ class Module(object):
     def config(self):
         if self._config is None:
 
-            if not self.raw_config:
-                self._config = {}
-                return self._config
-
-            self._config = read_config(
-                self.config_path,
-                self.config_vars,
-                self._raw_config,
-            )
+            self._config = read_config(self.config_path, self.config_vars) or {}
 
         return self._config
 
@@ -238,8 +247,37 @@ def read_raw_config(module_file):
         return f.read()
 
 
+def get_yaml_loader():
+    """Returns libyaml's CSafeLoader when it's available and compatible with
+    the vendored yaml package, otherwise the pure python SafeLoader."""
+
+    global _yaml_loader
+    if _yaml_loader is None:
+        _yaml_loader = yaml.SafeLoader
+        loader = getattr(yaml, "CSafeLoader", None)
+        if loader:
+            # The _yaml extension may belong to a different PyYAML install
+            try:
+                if yaml.load("a: [1]", Loader=loader) == {"a": [1]}:
+                    _yaml_loader = loader
+            except Exception as e:
+                _log.debug("CSafeLoader is unavailable: %s", e)
+
+    return _yaml_loader
+
+
+def load_yaml(data):
+    """Load yaml data using libyaml's CSafeLoader when it's available."""
+
+    return yaml.load(data, Loader=get_yaml_loader())
+
+
 def read_config(module_file, config_vars=None, data=None):
-    """Read and formats a module.yml file"""
+    """Read and formats a module.yml file
+
+    Parsed files are cached by path, mtime and size. Config variables are
+    substituted in the parsed data so cached files are never parsed again.
+    """
 
     if config_vars is None:
         config_vars = {
@@ -249,16 +287,53 @@ def read_config(module_file, config_vars=None, data=None):
         }
 
     if data is None:
-        with open(module_file, "r") as f:
-            data = f.read()
+        config = _read_cached_config(module_file)
+    else:
+        config = load_yaml(data)
+
+    return substitute_config(config, config_vars)
+
+
+def _read_cached_config(module_file):
+    stat = os.stat(module_file)
+    cache_key = (stat.st_mtime, stat.st_size)
+    cached = _config_cache.get(module_file)
+    if cached and cached[0] == cache_key:
+        return cached[1]
+
+    with open(module_file, "r") as f:
+        config = load_yaml(f.read())
+
+    if len(_config_cache) >= max_cached_configs:
+        _config_cache.clear()
+    _config_cache[module_file] = (cache_key, config)
+    return config
+
 
-    return yaml.safe_load(Template(data).safe_substitute(config_vars))
+def substitute_config(data, config_vars):
+    """Return a copy of parsed config data with config_vars substituted in all
+    strings."""
+
+    if isinstance(data, compat.string_types):
+        return mappings.substitute(data, config_vars)
+    if isinstance(data, dict):
+        return {
+            substitute_config(k, config_vars): substitute_config(v, config_vars)
+            for k, v in data.items()
+        }
+    if isinstance(data, list):
+        return [substitute_config(item, config_vars) for item in data]
+    return data
 
 
 def sort_modules(modules, reverse=False):
     """Sort a list of Modules or ModuleSpecs by version."""
 
-    return sorted(modules, key=lambda m: (m.qual_name, m.version), reverse=reverse)
+    return sorted(
+        modules,
+        key=lambda m: (m.qual_name, m.version.sort_key),
+        reverse=reverse,
+    )
 
 
 def is_module(path):
@@ -318,6 +393,12 @@ def is_exact_match(requirement, module_spec):
     """Is the module_spec an exact match for the provided requirement?"""
 
     name, version = parse_module_requirement(requirement)
+    return _is_exact_match(requirement, name, version, module_spec)
+
+
+def _is_exact_match(requirement, name, version, module_spec):
+    """Like is_exact_match but uses an already parsed name and version."""
+
     return (
         module_spec.qual_name == requirement
         or (version and module_spec.name == name and module_spec.version == version)
@@ -332,16 +413,17 @@ def is_partial_match(requirement, module_spec):
 
 
 def best_match(requirement, module_specs):
+    """Returns the first ModuleSpec that matches both name and version or the
+    ModuleSpec with the highest version > the required version."""
 
-    name, version = parse_module_requirement(
-        requirement, Version(0, 0, 0, None, None, "*")
-    )
+    name, version = parse_module_requirement(requirement)
+    min_version = version or Version(0, 0, 0, None, None, "*")
 
     best_match = None
     for module_spec in module_specs:
-        if is_exact_match(requirement, module_spec):
+        if _is_exact_match(requirement, name, version, module_spec):
             return module_spec
-        if version < module_spec.version:
+        if min_version < module_spec.version:
             if not best_match:
                 best_match = module_spec
                 continue
@@ -349,3 +431,48 @@ def best_match(requirement, module_specs):
                 best_match = module_spec
 
     return best_match
+
+
+class ModuleSpecIndex(object):
+    """Maps module names to lists of ModuleSpecs sorted by version.
+
+    Allows Repos to lookup requirements without scanning all of their
+    ModuleSpecs.
+    """
+
+    def __init__(self, module_specs):
+        self._specs = {}
+        self._versions = {}
+
+        for module_spec in module_specs:
+            self._specs.setdefault(module_spec.name, []).append(module_spec)
+
+        for name, specs in self._specs.items():
+            specs.sort(key=lambda m: m.version.sort_key)
+            self._versions[name] = [m.version.sort_key for m in specs]
+
+    def find(self, requirement):
+        """Return a list of ModuleSpecs that match the requirement.
+
+        Exact matches come first followed by the remaining versions ordered
+        from highest to lowest.
+        """
+
+        name, version = parse_module_requirement(requirement)
+        specs = self._specs.get(name)
+        if not specs:
+            return []
+
+        if not version:
+            return specs[::-1]
+
+        # Bisect to the range of specs with versions equal to version
+        versions = self._versions[name]
+        start = bisect_left(versions, version.sort_key)
+        end = bisect_right(versions, version.sort_key)
+        exact = [m for m in specs[start:end] if m.version == version]
+        if not exact:
+            return specs[::-1]
+
+        exact_ids = set([id(m) for m in exact])
+        return exact + [m for m in specs[::-1] if id(m) not in exact_ids]
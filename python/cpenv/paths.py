@@ -4,11 +4,54 @@ Tools for working with paths and files.
 """
 
 # Standard library imports
+import errno
+import hashlib
 import os
+import re
 import shutil
 import stat
+import struct
+import threading
+import time
+import uuid
 import zipfile
-from fnmatch import fnmatch
+import zlib
+from collections import deque, namedtuple
+from fnmatch import fnmatch, translate
+
+# Local imports
+from . import compat
+
+# Files at least this large are copied using os.copy_file_range when available
+large_file_size = 8388608
+
+# Files are compressed in chunks of this size when creating zip archives
+zip_chunk_size = 4194304
+
+# Already compressed files are stored in zip archives without compression
+stored_extensions = set(
+    [
+        ".7z",
+        ".bz2",
+        ".exr",
+        ".gif",
+        ".gz",
+        ".jpeg",
+        ".jpg",
+        ".mov",
+        ".mp4",
+        ".png",
+        ".rar",
+        ".tgz",
+        ".whl",
+        ".xz",
+        ".zip",
+    ]
+)
+
+# Names and fnmatch patterns excluded by exclusive_walk by default
+default_exclude_names = ["__pycache__", ".git", "thumbs.db", ".venv", "venv"]
+default_exclude_patterns = ["*.pyc", "*.egg-info"]
 
 
 def normalize(*parts):
@@ -58,6 +101,17 @@ def rmtree(path):
     shutil.rmtree(path, onerror=onerror)
 
 
+def replace(src, dst):
+    """Rename src to dst replacing dst if it exists."""
+
+    if hasattr(os, "replace"):
+        os.replace(src, dst)
+    else:
+        if os.name == "nt" and os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
 def walk_up(start_dir, depth=20):
     """Like os.walk but walks up a tree."""
 
@@ -103,7 +157,7 @@ def get_file_count(folder):
     """Get the number of files in a folder."""
 
     count = 0
-    for _, _, files in exclusive_walk(folder):
+    for _, _, files in exclusive_scandir(folder):
         count += len(files)
     return count
 
@@ -112,14 +166,289 @@ def get_folder_size(folder):
     """Get the size of a folder in bytes."""
 
     size = 0
-    for root, _, files in exclusive_walk(folder):
-        for file in files:
-            file_path = os.path.join(root, file)
-            if not os.path.islink(file_path):
-                size += os.path.getsize(file_path)
+    for _, _, files in exclusive_scandir(folder):
+        for entry in files:
+            if not entry.is_symlink():
+                size += entry.stat(follow_symlinks=False).st_size
     return size
 
 
+def copy_file(src, dst):
+    """Copy a file and it's metadata.
+
+    Large files are copied in kernel using os.copy_file_range when available,
+    falling back to shutil.copy2.
+    """
+
+    size = os.path.getsize(src)
+    if size < large_file_size or not hasattr(os, "copy_file_range"):
+        shutil.copy2(src, dst)
+        return size
+
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            while os.copy_file_range(fsrc.fileno(), fdst.fileno(), large_file_size):
+                pass
+    except OSError as e:
+        # Not supported by the filesystem or across filesystems
+        unsupported = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP)
+        if e.errno not in unsupported:
+            raise
+        shutil.copyfile(src, dst)
+
+    shutil.copystat(src, dst)
+    return size
+
+
+def copy_tree(
+    src,
+    dst,
+    progress_cb=None,
+    max_workers=8,
+    copy_function=copy_file,
+    manifest=None,
+):
+    """Copy the files in a folder to dst using a pool of threads.
+
+    Symlinks are skipped. All directories are created before any files are
+    copied.
+
+    Arguments:
+        src (str): Folder to copy.
+        dst (str): Destination folder.
+        progress_cb (callable): Called with the size of each copied file.
+        max_workers (int): Number of files to copy concurrently.
+        copy_function (callable): Called with src and dst paths of each file
+            returning the size of the file.
+        manifest (FolderManifest): Manifest of src. Scanned when not provided.
+    """
+
+    manifest = manifest or FolderManifest.from_folder(src)
+
+    for folder in sorted(manifest.folders):
+        ensure_path_exists(os.path.normpath(os.path.join(dst, folder)))
+
+    files = []
+    for info in manifest.files:
+        if not stat.S_ISLNK(info.mode):
+            dst_path = os.path.normpath(os.path.join(dst, info.rel_path))
+            files.append((info.path, dst_path))
+
+    if not files:
+        return
+
+    from multiprocessing.pool import ThreadPool
+
+    pool = ThreadPool(max(1, min(max_workers, len(files))))
+    try:
+        # Report progress from this thread as progress callbacks may
+        # update UI elements.
+        for size in pool.imap_unordered(lambda f: copy_function(*f), files):
+            if progress_cb:
+                progress_cb(size)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def sync_tree(src, dst, progress_cb=None, max_workers=8, manifest=None):
+    """Update dst to match the files in src.
+
+    Files are copied into a hidden sibling staging folder which is then
+    renamed to dst, so dst is never seen partially copied. Files in an
+    existing dst with the same size and modification time as their source
+    are linked into the staging folder instead of being copied again, and
+    files removed from src are removed from dst.
+    """
+
+    manifest = manifest or FolderManifest.from_folder(src)
+    file_stats = dict([(info.path, info) for info in manifest.files])
+    staging = staging_path(dst)
+
+    def sync_file(src_path, dst_path):
+        old_path = os.path.join(dst, os.path.relpath(dst_path, staging))
+        if is_same_file_stat(file_stats[src_path], old_path):
+            return link_or_copy(old_path, dst_path)
+        return copy_file(src_path, dst_path)
+
+    try:
+        copy_tree(src, staging, progress_cb, max_workers, sync_file, manifest)
+        publish(staging, dst)
+    finally:
+        if os.path.isdir(staging):
+            rmtree(staging)
+
+
+def sync_zip(zip_file, dst, progress_cb=None, max_workers=None):
+    """Update dst to match the members of a ZipFile.
+
+    Like sync_tree, but members are compared to the files in dst by size and
+    crc32 so only changed members are read from the archive. This allows
+    zip_file to be opened on a remote file.
+
+    When zip_file was opened from a path, members are compared and extracted
+    on a pool of threads, each reading the archive through its own ZipFile.
+    All folders are created before any members are extracted and unix file
+    permissions are restored.
+
+    Arguments:
+        zip_file (ZipFile): Archive to extract.
+        dst (str): Destination folder.
+        progress_cb (callable): Called with the compressed size of each
+            extracted member.
+        max_workers (int): Number of members to extract concurrently. Defaults
+            to the number of cpus.
+    """
+
+    from multiprocessing import cpu_count
+    from multiprocessing.pool import ThreadPool
+
+    staging = staging_path(dst)
+    zip_files = []
+    local = threading.local()
+
+    def get_zip_file():
+        if max_workers == 1:
+            return zip_file
+        if not getattr(local, "zip_file", None):
+            local.zip_file = zipfile.ZipFile(zip_file.filename)
+            zip_files.append(local.zip_file)
+        return local.zip_file
+
+    def sync_member(info):
+        old_path = os.path.join(dst, info.filename)
+        new_path = os.path.join(staging, info.filename)
+        if is_same_file_crc(old_path, info.file_size, info.CRC):
+            link_or_copy(old_path, new_path)
+            return 0
+
+        path = get_zip_file().extract(info, staging)
+        mode = (info.external_attr >> 16) & 0o7777
+        if mode and info.create_system == 3:
+            os.chmod(path, mode)
+        return info.compress_size
+
+    is_file_backed = isinstance(zip_file.filename, compat.string_types)
+    if is_file_backed and os.path.isfile(zip_file.filename):
+        max_workers = max_workers or cpu_count()
+    else:
+        max_workers = 1
+
+    pool = None
+    try:
+        ensure_path_exists(staging)
+        members = []
+        folders = set()
+        for info in zip_file.infolist():
+            parts = info.filename.split("/")
+            if info.filename.endswith("/") or ".." in parts or not parts[0]:
+                # Let ZipFile.extract sanitize folders and unsafe paths
+                zip_file.extract(info, staging)
+                continue
+
+            members.append(info)
+            folders.add(os.path.dirname(os.path.join(staging, info.filename)))
+
+        for folder in sorted(folders):
+            ensure_path_exists(folder)
+
+        if max_workers > 1 and len(members) > 1:
+            pool = ThreadPool(min(max_workers, len(members)))
+            results = pool.imap_unordered(sync_member, members)
+        else:
+            results = (sync_member(info) for info in members)
+
+        # Report progress from this thread as progress callbacks may
+        # update UI elements.
+        for size in results:
+            if size and progress_cb:
+                progress_cb(size)
+
+        publish(staging, dst)
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+        for handle in zip_files:
+            handle.close()
+        if os.path.isdir(staging):
+            rmtree(staging)
+
+
+def is_same_file_stat(src, dst):
+    """Returns True when dst has the same size and modification time as src.
+
+    src may be a path or an object with size and mtime attributes like the
+    FileInfo entries of a FolderManifest.
+    """
+
+    try:
+        if isinstance(src, compat.string_types):
+            src_stat = os.stat(src)
+            src = FileInfo(src, None, src_stat.st_size, None, src_stat.st_mtime)
+        dst_stat = os.stat(dst)
+    except OSError:
+        return False
+
+    same_size = src.size == dst_stat.st_size
+    return same_size and int(src.mtime) == int(dst_stat.st_mtime)
+
+
+def is_same_file_crc(path, size, crc):
+    """Returns True when a file has the given size and crc32 checksum."""
+
+    try:
+        if os.path.getsize(path) != size:
+            return False
+
+        value = 0
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1048576), b""):
+                value = zlib.crc32(chunk, value)
+    except (IOError, OSError):
+        return False
+
+    return value & 0xFFFFFFFF == crc
+
+
+def link_or_copy(src, dst):
+    """Hard link src to dst falling back to a copy when links are not supported."""
+
+    try:
+        os.link(src, dst)
+    except (AttributeError, OSError):
+        shutil.copy2(src, dst)
+    return os.path.getsize(dst)
+
+
+def staging_path(path):
+    """Returns a unique hidden sibling of path used to stage changes."""
+
+    root, name = os.path.split(os.path.normpath(path))
+    return os.path.join(root, ".%s.%s" % (name, uuid.uuid4().hex[:8]))
+
+
+def publish(staging, path):
+    """Move a staged folder to path replacing the existing folder.
+
+    New folders are published with a single rename. Existing folders are
+    renamed aside first, as directories can not be replaced by a rename.
+    """
+
+    if not os.path.isdir(path):
+        os.rename(staging, path)
+        return
+
+    old = staging_path(path)
+    os.rename(path, old)
+    try:
+        os.rename(staging, path)
+    except OSError:
+        os.rename(old, path)
+        raise
+    rmtree(old)
+
+
 def exclude_names(names):
     """Returns True when a file matches one of the provided names."""
 
@@ -165,6 +494,122 @@ def is_included(value, predicates):
     return any([predicate(value) for predicate in predicates])
 
 
+def compile_patterns(patterns):
+    """Compile a list of fnmatch patterns into a single regex.
+
+    Like fnmatch, patterns are matched case-insensitively on windows.
+    """
+
+    flags = re.IGNORECASE if os.name == "nt" else 0
+    return re.compile("|".join([translate(p) for p in patterns]), flags)
+
+
+default_exclude_names_set = set(default_exclude_names)
+default_exclude_patterns_regex = compile_patterns(default_exclude_patterns)
+
+
+def is_excluded_entry(root, entry, names):
+    """Returns True when a DirEntry matches the default excludes.
+
+    Matches the default predicates of exclusive_walk using the entry's name.
+    Names are case-sensitive like exclude_names, and patterns are matched
+    like exclude_patterns. Like include_prebuilt_pyc, .pyc files without an
+    accompanying .py file are not excluded. The normcased names in root are
+    used to look up .py files.
+    """
+
+    name = entry.name
+    if name in default_exclude_names_set:
+        return True
+
+    if not default_exclude_patterns_regex.match(name):
+        return False
+
+    is_prebuilt_pyc = (
+        name.endswith(".pyc")
+        and os.path.normcase(name[:-1]) not in names
+        and "__pycache__" not in root
+    )
+    return not is_prebuilt_pyc
+
+
+def get_predicates(excludes=None, includes=None):
+    """Returns the exclude and include predicates used by exclusive_walk,
+    falling back to the default predicates."""
+
+    excludes = excludes or [
+        exclude_names(default_exclude_names),
+        exclude_patterns(default_exclude_patterns),
+    ]
+    includes = includes or [include_prebuilt_pyc]
+    return excludes, includes
+
+
+def exclude_entries_by_predicates(excludes=None, includes=None):
+    """Returns a function like is_excluded_entry that checks the normalized
+    paths of DirEntries using exclude and include predicate functions."""
+
+    excludes, includes = get_predicates(excludes, includes)
+
+    def check_entry_against_predicates(root, entry, names):
+        path = normalize(entry.path)
+        return is_excluded(path, excludes) and not is_included(path, includes)
+
+    return check_entry_against_predicates
+
+
+def exclusive_scandir(folder, excludes=None, includes=None):
+    """Like exclusive_walk but yields os.DirEntry objects.
+
+    The entries cache the results of stat calls on most platforms, so they
+    can be used to get file sizes without an additional stat per file.
+
+    Arguments:
+        folder (str): Root folder to recursively walk.
+        excludes ([callable]): List of predicate functions used to exclude files.
+        includes ([callable]): List of predicate functions to include files. Overrides excludes.
+
+    Returns:
+        Generator yielding (root, dir_entries, file_entries).
+    """
+
+    # Like os.walk based walks, the root folder itself may be excluded
+    root_excludes, root_includes = get_predicates(excludes, includes)
+    if is_excluded(folder, root_excludes) and not is_included(folder, root_includes):
+        return
+
+    if excludes or includes:
+        exclude_entry = exclude_entries_by_predicates(excludes, includes)
+    else:
+        exclude_entry = is_excluded_entry
+
+    roots = [folder]
+    while roots:
+        root = roots.pop()
+        try:
+            entries = list(compat.scandir(root))
+        except OSError:
+            continue
+
+        names = set([os.path.normcase(entry.name) for entry in entries])
+        dirs = []
+        files = []
+        for entry in entries:
+            if exclude_entry(root, entry, names):
+                continue
+            if entry.is_dir():
+                dirs.append(entry)
+            else:
+                files.append(entry)
+
+        yield root, dirs, files
+
+        # Walk top-down in listing order without following symlinks like os.walk
+        for entry in reversed(dirs):
+            if not entry.is_symlink():
+                roots.append(entry.path)
+
+
 def exclusive_walk(folder, excludes=None, includes=None):
     """Like os.walk but excludes/includes files by using predicate functions.
 
@@ -184,25 +629,83 @@ def exclusive_walk(folder, excludes=None, includes=None):
         Generator yielding (root, subdirs, files).
     """
 
-    excludes = excludes or [
-        exclude_names(["__pycache__", ".git", "thumbs.db", ".venv", "venv"]),
-        exclude_patterns(["*.pyc", "*.egg-info"]),
-    ]
-    includes = includes or [include_prebuilt_pyc]
+    for root, dirs, files in exclusive_scandir(folder, excludes, includes):
+        yield root, [entry.name for entry in dirs], [entry.name for entry in files]
 
-    for root, subdirs, files in os.walk(folder):
-        if is_excluded(root, excludes) and not is_included(root, includes):
-            subdirs[:] = []
-            continue
 
-        included_files = []
-        for file in files:
-            path = normalize(root, file)
-            if is_excluded(path, excludes) and not is_included(path, includes):
-                continue
-            included_files.append(file)
+FileInfo = namedtuple("FileInfo", ["path", "rel_path", "size", "mode", "mtime"])
+
+
+class FolderManifest(object):
+    """The paths, sizes, modes and mtimes of the files in a folder.
+
+    Built in a single exclusive_scandir pass so a folder's metadata can be
+    shared by progress reporting, copying, zipping and hashing.
+
+    Attributes:
+        root (str): Scanned folder.
+        files ([FileInfo]): Files in the folder. Symlinks are not followed.
+        folders ([str]): Relative paths of all folders including root ".".
+    """
+
+    def __init__(self, root, files, folders):
+        self.root = root
+        self.files = files
+        self.folders = folders
+
+    def __repr__(self):
+        return "<{}>(root={!r}, file_count={!r}, size={!r})".format(
+            self.__class__.__name__,
+            self.root,
+            self.file_count,
+            self.size,
+        )
+
+    @classmethod
+    def from_folder(cls, folder, excludes=None, includes=None):
+        """Scan a folder using exclusive_scandir."""
+
+        files = []
+        folders = []
+        for root, _, entries in exclusive_scandir(folder, excludes, includes):
+            rel_root = os.path.relpath(root, folder)
+            folders.append(rel_root)
+            for entry in entries:
+                try:
+                    entry_stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                files.append(
+                    FileInfo(
+                        path=entry.path,
+                        rel_path=os.path.normpath(os.path.join(rel_root, entry.name)),
+                        size=entry_stat.st_size,
+                        mode=entry_stat.st_mode,
+                        mtime=entry_stat.st_mtime,
+                    )
+                )
+        return cls(folder, files, folders)
+
+    @property
+    def file_count(self):
+        return len(self.files)
+
+    @property
+    def size(self):
+        """Size of all files in bytes excluding symlinks."""
+
+        return sum([f.size for f in self.files if not stat.S_ISLNK(f.mode)])
+
+    def hash(self, algorithm="sha1"):
+        """Returns a hexdigest of the relative paths and contents of all files."""
 
-        yield root, subdirs, included_files
+        digest = hashlib.new(algorithm)
+        for info in sorted(self.files, key=lambda f: f.rel_path):
+            digest.update(info.rel_path.replace("\\", "/").encode("utf-8") + b"\0")
+            with open(info.path, "rb") as f:
+                for chunk in iter(lambda: f.read(1048576), b""):
+                    digest.update(chunk)
+        return digest.hexdigest()
 
 
 def get_folder_info(folder):
@@ -212,49 +715,360 @@ def get_folder_info(folder):
         A dict containing the size, file count, and list of files in, a folder.
     """
 
-    info = {
-        "size": 0,
-        "file_count": 0,
-        "files": [],
+    manifest = FolderManifest.from_folder(folder)
+    return {
+        "size": manifest.size,
+        "file_count": manifest.file_count,
+        "files": [(info.path, info.rel_path) for info in manifest.files],
     }
-    for root, subdirs, files in exclusive_walk(folder):
-        rel_root = os.path.relpath(root, folder)
-        for file in files:
-            file_path = os.path.join(root, file)
-            rel_path = os.path.join(rel_root, file)
-            info["size"] += os.path.getsize(file_path)
-            info["file_count"] += 1
-            info["files"].append((file_path, rel_path))
-    return info
 
 
-def zip_folder_from_info(info, where, progress_cb=None):
-    """Zips a folder using info provided by `get_folder_info`."""
+def zip_manifest(manifest, where, progress_cb=None, max_workers=None):
+    """Zips the files in a FolderManifest using a pool of threads.
 
-    parent = os.path.dirname(where)
-    if not os.path.isdir(parent):
-        os.makedirs(parent)
+    Files are read and deflated in chunks of zip_chunk_size by the pool while
+    this thread writes the compressed chunks to the archive in order. Chunks
+    are flushed to a byte boundary so they form a single deflate stream per
+    file. Files with extensions in stored_extensions are not compressed.
 
-    with zipfile.ZipFile(where, "w", zipfile.ZIP_DEFLATED) as zip_file:
-        for full_path, rel_path in info["files"]:
-            zip_file.write(full_path, arcname=rel_path)
-            if progress_cb:
-                progress_cb(1)
+    The archive is written to a staging path and renamed to where when it is
+    complete, so a failure never leaves a partial archive behind.
 
+    Arguments:
+        manifest (FolderManifest): Files to zip.
+        where (str): Path to the zip file to create.
+        progress_cb (callable): Called with 1 for each file written.
+        max_workers (int): Number of chunks to compress concurrently. Defaults
+            to the number of cpus.
+    """
 
-def zip_folder(folder, where):
-    """Zip the contents of a folder."""
+    from multiprocessing import cpu_count
+    from multiprocessing.pool import ThreadPool
 
     parent = os.path.dirname(where)
     if not os.path.isdir(parent):
         os.makedirs(parent)
 
-    # TODO: Count files first so we can report progress of building zip.
+    chunks = []
+    for info in manifest.files:
+        ext = os.path.splitext(info.path)[-1].lower()
+        if ext in stored_extensions:
+            compress_type = zipfile.ZIP_STORED
+        else:
+            compress_type = zipfile.ZIP_DEFLATED
+        count = max(1, -(-info.size // zip_chunk_size))
+        for i in range(count):
+            chunks.append((info, compress_type, i * zip_chunk_size, i == count - 1))
+
+    max_workers = max(1, min(max_workers or cpu_count(), len(chunks) or 1))
+    staging = staging_path(where)
+    pool = ThreadPool(max_workers)
+    try:
+        with open(staging, "wb") as f:
+            writer = ZipWriter(f)
+            results = imap_bounded(pool, read_zip_chunk, chunks, max_workers * 2)
+            for chunk, (data, compressed) in results:
+                info, compress_type, offset, last = chunk
+                if offset == 0:
+                    zip64 = info.size * 1.05 > zipfile.ZIP64_LIMIT
+                    writer.start_member(get_zip_info(info, compress_type), zip64)
+
+                writer.write(data, compressed)
+                if last:
+                    writer.end_member()
+                    if progress_cb:
+                        progress_cb(1)
+            writer.close()
+        replace(staging, where)
+    finally:
+        pool.terminate()
+        pool.join()
+        if os.path.exists(staging):
+            os.remove(staging)
+
+
+class ZipWriter(object):
+    """Writes a zip archive from members compressed by the caller.
+
+    zipfile.ZipFile can only write data it compresses itself, so the local
+    headers, central directory and end records are written here. Members
+    use zip64 extra fields when their sizes or offsets require it.
+
+    Arguments:
+        fp (file): Seekable file object opened for binary writing.
+    """
 
-    with zipfile.ZipFile(where, "w", zipfile.ZIP_DEFLATED) as zip_file:
-        for root, subdirs, files in exclusive_walk(folder):
-            rel_root = os.path.relpath(root, folder)
-            for file in files:
-                zip_file.write(
-                    os.path.join(root, file), arcname=os.path.join(rel_root, file)
+    def __init__(self, fp):
+        self.fp = fp
+        self.members = []
+        self._member = None
+        self._zip64 = False
+        self._crc = 0
+
+    def start_member(self, zinfo, zip64=False):
+        """Write the local header of a new member.
+
+        Arguments:
+            zinfo (ZipInfo): Member with a filename, date_time, compress_type
+                and external_attr.
+            zip64 (bool): Reserve zip64 sizes in the local header. Required
+                when the member may exceed zipfile.ZIP64_LIMIT.
+        """
+
+        zinfo.file_size = 0
+        zinfo.compress_size = 0
+        zinfo.CRC = 0
+        zinfo.header_offset = self.fp.tell()
+        self.fp.write(self._local_header(zinfo, zip64))
+        self._member = zinfo
+        self._zip64 = zip64
+        self._crc = 0
+
+    def write(self, data, compressed):
+        """Write a chunk of compressed data to the current member."""
+
+        self._crc = zlib.crc32(data, self._crc)
+        self._member.file_size += len(data)
+        self._member.compress_size += len(compressed)
+        self.fp.write(compressed)
+
+    def end_member(self):
+        """Rewrite the local header of the current member with its final
+        sizes and crc."""
+
+        zinfo = self._member
+        zinfo.CRC = self._crc & 0xFFFFFFFF
+        size = max(zinfo.file_size, zinfo.compress_size)
+        if not self._zip64 and size > zipfile.ZIP64_LIMIT:
+            raise zipfile.LargeZipFile(
+                "File grew too large while zipping: %s" % zinfo.filename
+            )
+
+        end = self.fp.tell()
+        self.fp.seek(zinfo.header_offset)
+        self.fp.write(self._local_header(zinfo, self._zip64))
+        self.fp.seek(end)
+        self.members.append(zinfo)
+        self._member = None
+
+    def close(self):
+        """Write the central directory and end of central directory records."""
+
+        start = self.fp.tell()
+        for zinfo in self.members:
+            self.fp.write(self._central_header(zinfo))
+        end = self.fp.tell()
+
+        count = len(self.members)
+        size = end - start
+        limit = zipfile.ZIP64_LIMIT
+        if count >= 0xFFFF or start > limit or size > limit:
+            self.fp.write(
+                struct.pack(
+                    "<4sQ2H2L4Q",
+                    b"PK\x06\x06",
+                    44,
+                    45,
+                    45,
+                    0,
+                    0,
+                    count,
+                    count,
+                    size,
+                    start,
                 )
+            )
+            self.fp.write(struct.pack("<4sLQL", b"PK\x06\x07", 0, end, 1))
+            count = min(count, 0xFFFF)
+            size = min(size, 0xFFFFFFFF)
+            start = min(start, 0xFFFFFFFF)
+
+        self.fp.write(
+            struct.pack("<4s4H2LH", b"PK\x05\x06", 0, 0, count, count, size, start, 0)
+        )
+
+    def _local_header(self, zinfo, zip64):
+        name, flags = self._encode_name(zinfo.filename)
+        dos_date, dos_time = self._dos_date_time(zinfo.date_time)
+        if zip64:
+            extra = struct.pack("<2H2Q", 1, 16, zinfo.file_size, zinfo.compress_size)
+            file_size = compress_size = 0xFFFFFFFF
+            version = 45
+        else:
+            extra = b""
+            file_size = zinfo.file_size
+            compress_size = zinfo.compress_size
+            version = 20
+
+        header = struct.pack(
+            "<4s2B4HL2L2H",
+            b"PK\x03\x04",
+            version,
+            0,
+            flags,
+            zinfo.compress_type,
+            dos_time,
+            dos_date,
+            zinfo.CRC,
+            compress_size,
+            file_size,
+            len(name),
+            len(extra),
+        )
+        return header + name + extra
+
+    def _central_header(self, zinfo):
+        name, flags = self._encode_name(zinfo.filename)
+        dos_date, dos_time = self._dos_date_time(zinfo.date_time)
+
+        # Values too large for their field are moved to a zip64 extra field
+        # in the order file_size, compress_size, header_offset.
+        values = [zinfo.file_size, zinfo.compress_size, zinfo.header_offset]
+        zip64_values = [v for v in values if v > zipfile.ZIP64_LIMIT]
+        file_size, compress_size, header_offset = [
+            0xFFFFFFFF if v > zipfile.ZIP64_LIMIT else v for v in values
+        ]
+        if zip64_values:
+            extra = struct.pack(
+                "<2H%dQ" % len(zip64_values), 1, 8 * len(zip64_values), *zip64_values
+            )
+            version = 45
+        else:
+            extra = b""
+            version = 20
+
+        header = struct.pack(
+            "<4s4B4HL2L5H2L",
+            b"PK\x01\x02",
+            version,
+            zinfo.create_system,
+            version,
+            0,
+            flags,
+            zinfo.compress_type,
+            dos_time,
+            dos_date,
+            zinfo.CRC,
+            compress_size,
+            file_size,
+            len(name),
+            len(extra),
+            0,
+            0,
+            0,
+            zinfo.external_attr,
+            header_offset,
+        )
+        return header + name + extra
+
+    @staticmethod
+    def _encode_name(filename):
+        if isinstance(filename, bytes):
+            return filename, 0
+        try:
+            return filename.encode("ascii"), 0
+        except UnicodeEncodeError:
+            return filename.encode("utf-8"), 0x800
+
+    @staticmethod
+    def _dos_date_time(date_time):
+        year, month, day, hour, minute, second = date_time
+        dos_date = (year - 1980) << 9 | month << 5 | day
+        dos_time = hour << 11 | minute << 5 | second // 2
+        return dos_date, dos_time
+
+
+def imap_bounded(pool, func, iterable, size):
+    """Like pool.imap but only keeps size tasks in flight, limiting the number
+    of results held in memory.
+
+    Returns:
+        Generator yielding (item, result) in the order of iterable.
+    """
+
+    pending = deque()
+    for item in iterable:
+        pending.append((item, pool.apply_async(func, (item,))))
+        if len(pending) >= size:
+            item, result = pending.popleft()
+            yield item, result.get()
+
+    while pending:
+        item, result = pending.popleft()
+        yield item, result.get()
+
+
+def read_zip_chunk(chunk):
+    """Read and compress a chunk of a file for zip_manifest.
+
+    The last chunk of a file is read to the end of the file, so files that are
+    larger than their FileInfo are fully included.
+
+    Returns:
+        Tuple containing the data and compressed data of the chunk.
+    """
+
+    info, compress_type, offset, last = chunk
+    with open(info.path, "rb") as f:
+        f.seek(offset)
+        if last:
+            data = f.read()
+        else:
+            data = f.read(zip_chunk_size)
+
+    if compress_type == zipfile.ZIP_STORED:
+        return data, data
+
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    if last:
+        return data, compressor.compress(data) + compressor.flush(zlib.Z_FINISH)
+    return data, compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def get_zip_info(info, compress_type):
+    """Returns a ZipInfo for a FileInfo. Symlinks are stored as the file they
+    point to like ZipFile.write."""
+
+    mode = info.mode
+    mtime = info.mtime
+    if stat.S_ISLNK(mode):
+        file_stat = os.stat(info.path)
+        mode = file_stat.st_mode
+        mtime = file_stat.st_mtime
+
+    date_time = time.localtime(mtime)[:6]
+    if date_time[0] < 1980:
+        date_time = (1980, 1, 1, 0, 0, 0)
+
+    arcname = os.path.normpath(info.rel_path).replace(os.sep, "/").lstrip("/")
+    zinfo = zipfile.ZipInfo(arcname, date_time)
+    zinfo.external_attr = (mode & 0xFFFF) << 16
+    zinfo.compress_type = compress_type
+    zinfo.file_size = 0
+    zinfo.compress_size = 0
+    zinfo.CRC = 0
+    return zinfo
+
+
+def zip_folder_from_info(info, where, progress_cb=None):
+    """Zips a folder using info provided by `get_folder_info`."""
+
+    files = []
+    for full_path, rel_path in info["files"]:
+        file_stat = os.lstat(full_path)
+        files.append(
+            FileInfo(
+                path=full_path,
+                rel_path=rel_path,
+                size=file_stat.st_size,
+                mode=file_stat.st_mode,
+                mtime=file_stat.st_mtime,
+            )
+        )
+    zip_manifest(FolderManifest(None, files, []), where, progress_cb)
+
+
+def zip_folder(folder, where):
+    """Zip the contents of a folder."""
+
+    zip_manifest(FolderManifest.from_folder(folder), where)
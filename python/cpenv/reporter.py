@@ -1,14 +1,22 @@
 # -*- coding: utf-8 -*-
 import contextlib
 import sys
+import threading
+
+try:
+    from queue import Empty, Queue
+except ImportError:
+    from Queue import Empty, Queue
 
 __all__ = [
     "set_reporter",
     "get_reporter",
+    "thread_reporter",
     "Reporter",
 ]
 this = sys.modules[__name__]
 this._reporter = None
+this._local = threading.local()
 
 
 def set_reporter(reporter, *args, **kwargs):
@@ -19,11 +27,31 @@ def set_reporter(reporter, *args, **kwargs):
 
 
 def get_reporter():
+    reporter = getattr(this._local, "reporter", None)
+    if reporter is not None:
+        return reporter
+
     if this._reporter is None:
         this._reporter = Reporter()
     return this._reporter
 
 
+@contextlib.contextmanager
+def thread_reporter(reporter):
+    """Use reporter for reports made by the current thread.
+
+    Worker threads use this to send their reports to a QueuedReporter without
+    replacing the reporter used by other threads.
+    """
+
+    previous = getattr(this._local, "reporter", None)
+    this._local.reporter = reporter
+    try:
+        yield reporter
+    finally:
+        this._local.reporter = previous
+
+
 class ProgressBar(object):
     def __init__(self, reporter, label, max_size, data):
         self.reporter = reporter
@@ -84,3 +112,65 @@ class Reporter(object):
             yield bar
         finally:
             bar.end()
+
+
+class QueuedReporter(Reporter):
+    """Queues reports made from worker threads.
+
+    Call dispatch from the thread that owns the wrapped reporter to forward
+    the queued reports. This keeps reporters that update UI elements on a
+    single thread while work is spread across many.
+    """
+
+    def __init__(self, reporter):
+        self.reporter = reporter
+        self.queue = Queue()
+
+    def dispatch(self, timeout=None):
+        """Forward queued reports to the wrapped reporter.
+
+        Arguments:
+            timeout (float): Seconds to wait for the first report.
+        """
+
+        block = timeout is not None
+        while True:
+            try:
+                method, args = self.queue.get(block, timeout)
+            except Empty:
+                return
+            getattr(self.reporter, method)(*args)
+            block = False
+
+    def _put(self, method, *args):
+        self.queue.put((method, args))
+
+    def start_resolve(self, requirements):
+        self._put("start_resolve", requirements)
+
+    def find_requirement(self, requirement):
+        self._put("find_requirement", requirement)
+
+    def resolve_requirement(self, requirement, module_spec):
+        self._put("resolve_requirement", requirement, module_spec)
+
+    def end_resolve(self, resolved, unresolved):
+        self._put("end_resolve", resolved, unresolved)
+
+    def start_localize(self, module_specs):
+        self._put("start_localize", module_specs)
+
+    def localize_module(self, module_spec, module):
+        self._put("localize_module", module_spec, module)
+
+    def end_localize(self, localized):
+        self._put("end_localize", localized)
+
+    def start_progress(self, label, max_size, data):
+        self._put("start_progress", label, max_size, data)
+
+    def update_progress(self, label, chunk_size, data):
+        self._put("update_progress", label, chunk_size, data)
+
+    def end_progress(self, label, data):
+        self._put("end_progress", label, data)
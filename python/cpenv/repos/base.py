@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
 
+# Local imports
+from ..module import ModuleSpec
+from ..versions import parse_version
+
 
 class Repo(object):
     """Base class for all Repos.
@@ -37,6 +41,57 @@ class Repo(object):
 
         return NotImplemented
 
+    def find_many(self, requirements):
+        """Given a list of requirements, return a dict mapping each requirement
+        to a list of ModuleSpecs that match.
+
+        Falls back to calling find for each requirement. Repos backed by a
+        remote service should override this to lookup all requirements at once.
+        """
+
+        return {requirement: self.find(requirement) for requirement in requirements}
+
+    def lock(self, module_specs):
+        """Given a list of module_specs, return a list of dicts that can be
+        passed to from_lock to recreate the module_specs without a lookup.
+
+        Repos can extend the dicts with data used to detect stale locks.
+        """
+
+        return [
+            {
+                "name": module_spec.name,
+                "qual_name": module_spec.qual_name,
+                "version": module_spec.version.string,
+                "repo": self.name,
+                "path": module_spec.path,
+            }
+            for module_spec in module_specs
+        ]
+
+    def from_lock(self, data):
+        """Given a dict returned by lock, return a ModuleSpec.
+
+        Return None when the lock data is stale.
+        """
+
+        return ModuleSpec(
+            name=data["name"],
+            qual_name=data["qual_name"],
+            version=parse_version(data["version"]),
+            path=data["path"],
+            repo=self,
+        )
+
+    def from_lock_many(self, data):
+        """Given a list of dicts returned by lock, return a list of ModuleSpecs.
+
+        Stale lock data returns None in place of a ModuleSpec. Repos can
+        override this to check many modules at once.
+        """
+
+        return [self.from_lock(module_data) for module_data in data]
+
     def list(self):
         """Return a list of ModuleSpecs in this Repo."""
 
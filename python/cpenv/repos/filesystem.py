@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 
 # Standard library imports
+import json
 import logging
 import os
-import shutil
+import threading
+import uuid
 from fnmatch import fnmatch
 from functools import partial
 from glob import glob
@@ -11,10 +13,11 @@ from glob import glob
 # Local imports
 from .. import compat, paths
 from ..environment import Environment
-from ..module import Module, is_exact_match, is_partial_match, sort_modules
+from ..module import Module, ModuleSpec, ModuleSpecIndex, load_yaml, sort_modules
 from ..reporter import get_reporter
 from ..vendor import yaml
 from ..vendor.cachetools import TTLCache, cachedmethod, keys
+from ..versions import parse_version
 from .base import Repo
 
 _log = logging.getLogger(__name__)
@@ -38,15 +41,22 @@ class LocalRepo(Repo):
             precedence over higher priority. Defaults to 10.
         nested (bool): When True the Repository will use the Nested hierarchy. Defaults
             to False.
+        index (bool): When True the Repository will store an index of its modules
+            in a .cpenv_index folder. Defaults to True.
     """
 
     type_name = "local"
     priority = 10
+    index_dir = ".cpenv_index"
+    index_name = "index.json"
+    index_version = 1
 
-    def __init__(self, name, path, priority=None, nested=None):
+    def __init__(self, name, path, priority=None, nested=None, index=True):
         super(LocalRepo, self).__init__(name, priority)
         self.path = paths.normalize(path)
-        self.cache = TTLCache(maxsize=10, ttl=60)
+        self.cache = TTLCache(maxsize=100, ttl=60)
+        self.cache_lock = threading.RLock()
+        self.index = index
 
         self.nested = nested
         if nested is None:
@@ -56,71 +66,226 @@ class LocalRepo(Repo):
         return paths.normalize(self.path, *parts)
 
     def clear_cache(self):
-        self.cache.clear()
+        with self.cache_lock:
+            self.cache.clear()
 
-    @cachedmethod(lambda self: self.cache, key=partial(keys.hashkey, "find"))
-    def find(self, requirement):
-        matches = []
-        for module_spec in self.list():
-            if is_exact_match(requirement, module_spec):
-                matches.insert(0, module_spec)
-                continue
-            if is_partial_match(requirement, module_spec):
-                matches.append(module_spec)
+    def reindex(self):
+        """Rebuild this repo's index reading every module.yml.
+
+        The index is validated using directory mtimes only, so modules whose
+        module.yml was edited in place are picked up after a reindex.
+        """
 
-        return matches
+        self._write_index(self._build_index())
+        self.clear_cache()
 
-    @cachedmethod(lambda self: self.cache, key=partial(keys.hashkey, "list"))
+    @cachedmethod(
+        lambda self: self.cache,
+        key=partial(keys.hashkey, "find"),
+        lock=lambda self: self.cache_lock,
+    )
+    def find(self, requirement):
+        return self.spec_index().find(requirement)
+
+    @cachedmethod(
+        lambda self: self.cache,
+        key=partial(keys.hashkey, "spec_index"),
+        lock=lambda self: self.cache_lock,
+    )
+    def spec_index(self):
+        """Returns a ModuleSpecIndex built from this repo's ModuleSpecs."""
+
+        return ModuleSpecIndex(self.list())
+
+    @cachedmethod(
+        lambda self: self.cache,
+        key=partial(keys.hashkey, "list"),
+        lock=lambda self: self.cache_lock,
+    )
     def list(self):
+        index = self._read_index()
+        if not self._is_index_valid(index):
+            index = self._build_index(index)
+            self._write_index(index)
+
         module_specs = []
+        for entry in index["modules"]:
+            version = parse_version(entry["version"])
+            module_specs.append(
+                ModuleSpec(
+                    name=entry["name"],
+                    qual_name=entry["name"] + "-" + version.string,
+                    version=version,
+                    path=self.relative_path(entry["path"]),
+                    repo=self,
+                )
+            )
 
-        # Find flat module_specs
-        for module_file in glob(self.relative_path("*", "module.yml")):
+        return sort_modules(module_specs, reverse=True)
+
+    def _get_mtime(self, *parts):
+        try:
+            return os.stat(os.path.join(self.path, *parts)).st_mtime
+        except OSError:
+            return None
+
+    def _read_index(self):
+        """Read this repo's index file.
+
+        The index stores the name, version, path and config mtime of each
+        module along with the mtimes of the directories that were scanned to
+        build it. Returns an empty index if the file is missing or invalid.
+        """
+
+        empty_index = {"version": self.index_version, "dirs": {}, "modules": []}
+        if not self.index:
+            return empty_index
+
+        index_path = self.relative_path(self.index_dir, self.index_name)
+        try:
+            with open(index_path, "r") as f:
+                index = json.load(f)
+        except (IOError, OSError, ValueError):
+            return empty_index
+
+        if not isinstance(index, dict) or index.get("version") != self.index_version:
+            return empty_index
+
+        return index
+
+    def _is_index_valid(self, index):
+        """Validate an index by comparing the mtimes of the scanned directories.
+
+        Adding or removing a flat module changes the mtime of the repo folder
+        while adding or removing a nested module changes the mtime of its
+        parent folder. Editing a module.yml in place changes neither, those
+        edits are picked up by reindex.
+        """
+
+        if not index["dirs"]:
+            return False
+
+        for rel_dir, mtime in index["dirs"].items():
+            if self._get_mtime(rel_dir) != mtime:
+                return False
+
+        return True
+
+    def _build_index(self, index=None):
+        """Scan this repo for modules and return a new index.
+
+        Entries from the provided index are reused when the mtime of their
+        module.yml is unchanged, so only new or modified configs are read.
+        Directory mtimes are recorded before they are scanned.
+        """
+
+        previous = {}
+        if index:
+            previous = {entry["path"]: entry for entry in index["modules"]}
+
+        # Create the index folder first so writing the index later does not
+        # change the mtime of the repo folder.
+        index_dir = self.relative_path(self.index_dir)
+        if self.index and not os.path.isdir(index_dir):
+            try:
+                os.makedirs(index_dir)
+            except OSError as e:
+                _log.debug("Failed to create index folder %s: %s", index_dir, e)
+
+        dirs = {"": self._get_mtime()}
+        modules = []
+
+        def add_module(module_file):
             module_path = paths.parent(module_file)
+            rel_path = os.path.relpath(module_path, self.path).replace("\\", "/")
+            mtime = self._get_mtime(rel_path, "module.yml")
+
+            entry = previous.get(rel_path)
+            if entry and entry["mtime"] == mtime:
+                modules.append(entry)
+                return
+
             module = Module(module_path, repo=self)
-            module_specs.append(module.to_spec())
+            modules.append(
+                {
+                    "name": module.name,
+                    "version": module.version.string,
+                    "path": rel_path,
+                    "mtime": mtime,
+                }
+            )
+
+        # Find flat module_specs
+        flat_dirs = set()
+        for module_file in glob(self.relative_path("*", "module.yml")):
+            flat_dirs.add(os.path.basename(paths.parent(module_file)))
+            add_module(module_file)
 
         # Find nested module_specs
+        for name_dir in glob(self.relative_path("*")):
+            name = os.path.basename(name_dir)
+            if name not in flat_dirs and os.path.isdir(name_dir):
+                dirs[name] = self._get_mtime(name)
+
         versions = glob(self.relative_path("*", "*", "module.yml"))
         for version_file in versions:
-            version_dir = paths.parent(version_file)
-            module = Module(version_dir, repo=self)
-            module_specs.append(module.to_spec())
+            add_module(version_file)
 
-        return sort_modules(module_specs, reverse=True)
+        return {"version": self.index_version, "dirs": dirs, "modules": modules}
+
+    def _write_index(self, index):
+        """Write an index file to this repo. Fails silently as the repo may be
+        read-only for the current user.
+
+        The index is written to a temporary file and renamed into place so
+        readers never see a partially written index. It is not written when
+        the scanned directories changed while it was built, as modules
+        published during the scan may be missing from it.
+        """
+
+        if not self.index or not index["modules"]:
+            return
+
+        if not self._is_index_valid(index):
+            _log.debug("%s changed while building its index.", self.path)
+            return
+
+        index_path = self.relative_path(self.index_dir, self.index_name)
+        tmp_path = index_path + "." + uuid.uuid4().hex[:8]
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(index, f)
+            paths.replace(tmp_path, index_path)
+        except (IOError, OSError) as e:
+            _log.debug("Failed to write index %s: %s", index_path, e)
+            if os.path.isfile(tmp_path):
+                os.remove(tmp_path)
+
+    def from_lock(self, data):
+        if not os.path.isfile(os.path.join(data["path"], "module.yml")):
+            return
+
+        return super(LocalRepo, self).from_lock(data)
 
     def download(self, module_spec, where, overwrite=False):
-        if os.path.isdir(where):
-            if not overwrite:
-                raise OSError("%s already exists..." % where)
-            else:
-                paths.rmtree(where)
+        if os.path.isdir(where) and not overwrite:
+            raise OSError("%s already exists..." % where)
 
         src = module_spec.path
         dst = where
 
+        # Scan src once for progress reporting and copying
+        manifest = paths.FolderManifest.from_folder(src)
+
         reporter = get_reporter()
         progress_bar = reporter.progress_bar(
             label="Download %s" % module_spec.name,
-            max_size=self.get_size(module_spec),
+            max_size=manifest.size,
             data={"module_spec": module_spec},
         )
         with progress_bar as progress_bar:
-            for root, _, files in paths.exclusive_walk(src):
-                for file in files:
-                    src_path = os.path.join(root, file)
-                    rel_path = os.path.relpath(src_path, src)
-                    dst_path = os.path.join(dst, rel_path)
-
-                    if os.path.islink(src_path):
-                        continue
-
-                    dst_dir = os.path.dirname(dst_path)
-                    if not os.path.isdir(dst_dir):
-                        os.makedirs(dst_dir)
-
-                    shutil.copy2(src_path, dst_path)
-                    progress_bar.update(os.path.getsize(src_path))
+            # Only changed files are copied when overwriting a module
+            paths.sync_tree(src, dst, progress_bar.update, copy_workers(), manifest)
 
             module = Module(where)
             progress_bar.update(
@@ -145,37 +310,24 @@ class LocalRepo(Repo):
         else:
             new_module_path = self.relative_path(module.qual_name)
 
-        if os.path.isdir(new_module_path):
-            if overwrite:
-                paths.rmtree(new_module_path)
-            else:
-                raise OSError("Module already exists in repo...")
+        if os.path.isdir(new_module_path) and not overwrite:
+            raise OSError("Module already exists in repo...")
 
         src = module.path
         dst = new_module_path
 
+        # Scan src once for progress reporting and copying
+        manifest = paths.FolderManifest.from_folder(src)
+
         reporter = get_reporter()
         progress_bar = reporter.progress_bar(
             label="Upload %s" % module.name,
-            max_size=self.get_size(module),
+            max_size=manifest.size,
             data={"module": module, "to_repo": self},
         )
         with progress_bar as progress_bar:
-            for root, _, files in paths.exclusive_walk(src):
-                for file in files:
-                    src_path = os.path.join(root, file)
-                    rel_path = os.path.relpath(src_path, src)
-                    dst_path = os.path.join(dst, rel_path)
-
-                    if os.path.islink(src_path):
-                        continue
-
-                    dst_dir = os.path.dirname(dst_path)
-                    if not os.path.isdir(dst_dir):
-                        os.makedirs(dst_dir)
-
-                    shutil.copy2(src_path, dst_path)
-                    progress_bar.update(os.path.getsize(src_path))
+            # Only changed files are copied when overwriting a module
+            paths.sync_tree(src, dst, progress_bar.update, copy_workers(), manifest)
 
             module_spec = Module(new_module_path).to_spec()
             progress_bar.update(
@@ -206,7 +358,7 @@ class LocalRepo(Repo):
             raise OSError("module_spec.path does not appear to exist.")
 
         module = Module(module_spec.path)
-        return yaml.safe_load(module.raw_config)
+        return load_yaml(module.raw_config)
 
     def get_size(self, module_spec):
         """Sums the size of all files in the modules directory."""
@@ -323,3 +475,12 @@ class RemoteRepo(LocalRepo):
 
     type_name = "remote"
     priority = 15
+
+
+def copy_workers():
+    """Number of files to copy concurrently from $CPENV_COPY_WORKERS."""
+
+    try:
+        return int(os.getenv("CPENV_COPY_WORKERS", 8))
+    except ValueError:
+        return 8
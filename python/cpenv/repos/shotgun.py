@@ -1,17 +1,23 @@
 # -*- coding: utf-8 -*-
 # Standard library imports
-import io
+import calendar
+import json
+import logging
 import os
+import re
+import threading
+import uuid
 import zipfile
+from datetime import datetime
 from functools import partial
 
 # Local imports
-from .. import http, paths
+from .. import archives, paths
 from ..module import Module, ModuleSpec, parse_module_requirement, sort_modules
 from ..reporter import get_reporter
 from ..vendor import yaml
 from ..vendor.cachetools import TTLCache, cachedmethod, keys
-from ..vendor.shotgun_api3 import Shotgun
+from ..vendor.fasteners import InterProcessLock
 from ..versions import parse_version
 from .base import Repo
 
@@ -23,6 +29,9 @@ MODULE_SIZE_UNSUPPORTED = (
 )
 
 
+_log = logging.getLogger(__name__)
+
+
 class UploadError(Exception):
     pass
 
@@ -84,6 +93,10 @@ class ShotgunRepo(Repo):
             # This will be done via the tk-cpenv shotgun app
             self._api = api
         else:
+            # Import shotgun_api3 only when needed as it is slow to import
+            from .. import http
+            from ..vendor.shotgun_api3 import Shotgun
+
             self._api = Shotgun(
                 base_url=base_url,
                 script_name=script_name,
@@ -91,6 +104,11 @@ class ShotgunRepo(Repo):
                 ca_certs=http.ca_certs(),
             )
 
+        # shotgun_api3.Shotgun is not thread-safe but modules may be
+        # downloaded concurrently, so all api calls are made using a lock.
+        self._api_lock = threading.RLock()
+        self._locked_api = LockedApi(self._api, self._api_lock)
+
         self.base_url = self._api.base_url
         self.path = self._api.base_url
         self.module_entity = module_entity
@@ -105,16 +123,24 @@ class ShotgunRepo(Repo):
         ]
         self.archive_fields = ["sg_archive", "sg_archive_size"]
         self._supports_large_modules = None
+        self._catalogue = None
+        self._catalogue_lock = threading.RLock()
         self.cache = TTLCache(maxsize=10, ttl=60)
+        self.cache_lock = threading.RLock()
 
     @property
     def shotgun(self):
-        return self._api
+        return self._locked_api
 
     def clear_cache(self):
-        self.cache.clear()
+        with self.cache_lock:
+            self.cache.clear()
 
-    @cachedmethod(lambda self: self.cache, key=partial(keys.hashkey, "find"))
+    @cachedmethod(
+        lambda self: self.cache,
+        key=partial(keys.hashkey, "find"),
+        lock=lambda self: self.cache_lock,
+    )
     def find(self, requirement):
         name, version = parse_module_requirement(requirement)
 
@@ -144,20 +170,241 @@ class ShotgunRepo(Repo):
 
         return sort_modules(module_specs, reverse=True)
 
-    @cachedmethod(lambda self: self.cache, key=partial(keys.hashkey, "list"))
-    def list(self):
+    def find_many(self, requirements):
+        """Lookup all requirements using a single shotgun query."""
+
+        results = {}
+        parsed = {}
+        for requirement in requirements:
+            with self.cache_lock:
+                module_specs = self.cache.get(keys.hashkey("find", requirement))
+            if module_specs is not None:
+                results[requirement] = module_specs
+            else:
+                parsed[requirement] = parse_module_requirement(requirement)
+
+        if not parsed:
+            return results
+
+        names = list(set([name for name, _ in parsed.values()]))
         entities = self.shotgun.find(
             self.module_entity,
-            filters=[],
+            filters=[["code", "in", names]],
             fields=self.resolve_fields,
         )
+
+        for requirement, (name, version) in parsed.items():
+            # Prefer exact matches falling back to simple name matches
+            matches = [e for e in entities if e["code"] == name]
+            if version:
+                exact = [e for e in matches if e["sg_version"] == version.string]
+                matches = exact or matches
+
+            module_specs = sort_modules(
+                [entity_to_module_spec(entity, self) for entity in matches],
+                reverse=True,
+            )
+            with self.cache_lock:
+                self.cache[keys.hashkey("find", requirement)] = module_specs
+            results[requirement] = module_specs
+
+        return results
+
+    def lock(self, module_specs):
+        """Include the archive id and size of each module using a single
+        shotgun query."""
+
+        data = super(ShotgunRepo, self).lock(module_specs)
+        if not module_specs:
+            return data
+
+        archives = self._find_archives([d["name"] for d in data])
+        for module_data in data:
+            key = (module_data["name"], module_data["version"])
+            archive_id, archive_size = archives.get(key, (None, 0))
+            module_data["archive_id"] = archive_id
+            module_data["archive_size"] = archive_size
+
+        return data
+
+    def from_lock(self, data):
+        return self.from_lock_many([data])[0]
+
+    def from_lock_many(self, data):
+        """Compare the archive id and size of each module with shotgun using a
+        single query. Modules that were removed or uploaded again are stale."""
+
+        if not data:
+            return []
+
+        archives = self._find_archives([d["name"] for d in data])
         module_specs = []
+        for module_data in data:
+            key = (module_data["name"], module_data["version"])
+            locked = (module_data.get("archive_id"), module_data.get("archive_size"))
+            if key not in archives or archives[key] != locked:
+                module_specs.append(None)
+            else:
+                module_specs.append(super(ShotgunRepo, self).from_lock(module_data))
+
+        return module_specs
+
+    def _find_archives(self, names):
+        """Returns the archive id and size of Module entities by code and
+        sg_version."""
+
+        entities = self.shotgun.find(
+            self.module_entity,
+            filters=[["code", "in", list(set(names))]],
+            fields=["code", "sg_version"] + self.archive_fields,
+        )
+        archives = {}
         for entity in entities:
+            archive = entity["sg_archive"] or {}
+            archives[(entity["code"], entity["sg_version"])] = (
+                archive.get("id"),
+                self._decode_archive_size(entity["sg_archive_size"] or 0),
+            )
+
+        return archives
+
+    @cachedmethod(
+        lambda self: self.cache,
+        key=partial(keys.hashkey, "list"),
+        lock=lambda self: self.cache_lock,
+    )
+    def list(self):
+        module_specs = []
+        for entity in self.sync_catalogue():
             module_specs.append(entity_to_module_spec(entity, self))
 
         return sort_modules(module_specs, reverse=True)
 
+    @property
+    def catalogue_path(self):
+        """Path to the local catalogue of Module entities in the cache dir."""
+
+        from .. import api
+
+        site = self.base_url.split("://")[-1]
+        name = re.sub(r"[^\w.-]+", "_", site + "_" + self.module_entity)
+        return api.get_cache_path("shotgun", name + ".json")
+
+    def sync_catalogue(self):
+        """Sync and return the local catalogue of Module entities.
+
+        The first sync fetches all Module entities. Subsequent syncs only
+        fetch entities updated since the last sync and then compare the
+        number of entities in shotgun with the catalogue to detect deleted
+        entities. The whole catalogue is refetched when the counts differ.
+        The catalogue file is only rewritten when the sync changed it.
+        """
+
+        with self._catalogue_lock:
+            if self._catalogue is None:
+                self._catalogue = self._read_catalogue()
+
+            catalogue = self._catalogue
+            if catalogue["last_sync"] is None:
+                changed = self._update_catalogue(
+                    catalogue, self._find_catalogue_entities(), True
+                )
+            else:
+                # Overlap the previous sync by a second as updated_at is
+                # stored with a resolution of one second.
+                since = self._to_sg_datetime(catalogue["last_sync"] - 1)
+                entities = self._find_catalogue_entities(
+                    [["updated_at", "greater_than", since]]
+                )
+                changed = self._update_catalogue(catalogue, entities)
+
+                # All entities in shotgun are now in the catalogue, so if the
+                # counts match no entities were deleted.
+                summary = self.shotgun.summarize(
+                    self.module_entity,
+                    filters=[],
+                    summary_fields=[{"field": "id", "type": "count"}],
+                )
+                if summary["summaries"]["id"] != len(catalogue["entities"]):
+                    changed = self._update_catalogue(
+                        catalogue, self._find_catalogue_entities(), True
+                    )
+
+            if changed:
+                self._write_catalogue(catalogue)
+            return list(catalogue["entities"].values())
+
+    def _find_catalogue_entities(self, filters=None):
+        return self.shotgun.find(
+            self.module_entity,
+            filters=filters or [],
+            fields=self.resolve_fields + ["updated_at"],
+        )
+
+    def _update_catalogue(self, catalogue, entities, full=False):
+        """Add entities to the catalogue. Returns True if it changed."""
+
+        changed = full
+        if full:
+            catalogue["entities"] = {}
+            catalogue["last_sync"] = None
+
+        for entity in entities:
+            key = str(entity["id"])
+            entry = {
+                "id": entity["id"],
+                "code": entity["code"],
+                "sg_version": entity["sg_version"],
+            }
+            if catalogue["entities"].get(key) != entry:
+                catalogue["entities"][key] = entry
+                changed = True
+
+            if not entity["updated_at"]:
+                continue
+
+            updated_at = calendar.timegm(entity["updated_at"].utctimetuple())
+            if catalogue["last_sync"] is None or updated_at > catalogue["last_sync"]:
+                catalogue["last_sync"] = updated_at
+                changed = True
+
+        return changed
+
+    def _to_sg_datetime(self, timestamp):
+        """Convert a UTC timestamp to a datetime to use in shotgun filters."""
+
+        if getattr(self.shotgun.config, "convert_datetimes_to_utc", True):
+            # Shotgun converts naive datetimes from local time to UTC
+            return datetime.fromtimestamp(timestamp)
+        return datetime.utcfromtimestamp(timestamp)
+
+    def _read_catalogue(self):
+        catalogue = {"version": 1, "last_sync": None, "entities": {}}
+        try:
+            with open(self.catalogue_path, "r") as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return catalogue
+
+        if isinstance(data, dict) and data.get("version") == catalogue["version"]:
+            return data
+        return catalogue
+
+    def _write_catalogue(self, catalogue):
+        catalogue_path = self.catalogue_path
+        tmp_path = catalogue_path + "." + uuid.uuid4().hex[:8]
+        try:
+            paths.ensure_path_exists(os.path.dirname(catalogue_path))
+            with open(tmp_path, "w") as f:
+                json.dump(catalogue, f)
+            paths.replace(tmp_path, catalogue_path)
+        except (IOError, OSError) as e:
+            _log.debug("Failed to write catalogue %s: %s", catalogue_path, e)
+            if os.path.isfile(tmp_path):
+                os.remove(tmp_path)
+
     def download(self, module_spec, where, overwrite=False):
+        from .. import api, http
 
         entity = self.shotgun.find_one(
             self.module_entity,
@@ -170,17 +417,24 @@ class ShotgunRepo(Repo):
             print("Module entity has no associated archive.")
             return
 
-        if os.path.isdir(where):
-            if overwrite:
-                paths.rmtree(where)
-            else:
-                raise Exception("Module already exists in download location.")
+        if os.path.isdir(where) and not overwrite:
+            raise Exception("Module already exists in download location.")
+
+        # Archives are stored by attachment id and size so modules can be
+        # localized again without downloading them.
+        archive_size = self._decode_archive_size(entity["sg_archive_size"] or 0)
+        archive_key = "shotgun-%s-%s" % (archive.get("id", entity["id"]), archive_size)
+        store = archives.get_store()
+
+        # Download archive to a file in the cache so memory use does not
+        # depend on the size of the module. The archive path is stable so an
+        # interrupted download can be resumed.
+        downloads = api.get_cache_path("downloads")
+        paths.ensure_path_exists(downloads)
+        download_path = paths.normalize(downloads, archive_key + ".zip")
 
-        # Download archive data - we add a chunk to download_size for zip
-        # progress reporting.
         reporter = get_reporter()
-        chunk_size = 8192
-        download_size = kb(self.get_size(module_spec))
+        download_size = kb(archive_size)
         progress_bar = reporter.progress_bar(
             label="Download %s" % module_spec.name,
             max_size=download_size,
@@ -190,18 +444,40 @@ class ShotgunRepo(Repo):
             },
         )
         with progress_bar as progress_bar:
-            response = http.get(archive["url"])
-            data = io.BytesIO()
-            while True:
-                chunk = response.read(chunk_size)
-                if not chunk:
-                    break
-                progress_bar.update(kb(len(chunk)))
-                data.write(chunk)
-
-            # Construct and extract in-memory zip archive
-            zip_file = zipfile.ZipFile(data)
-            zip_file.extractall(where)
+
+            def progress_cb(size):
+                progress_bar.update(kb(size))
+
+            with InterProcessLock(download_path + ".lock"):
+                # Only check the size of stored archives when it is known
+                archive_path = store.get(archive_key, archive_size or None)
+                if archive_path:
+                    progress_bar.update(download_size)
+                elif os.path.isdir(where) and self._sync_remote_archive(
+                    archive["url"], where, progress_cb
+                ):
+                    # Only the members that changed were downloaded
+                    archive_path = None
+                else:
+                    archive_path = http.download(
+                        archive["url"],
+                        download_path,
+                        progress_cb=progress_cb,
+                    )
+                    if store.enabled:
+                        archive_path = store.add(archive_key, archive_path)
+
+                if archive_path:
+                    try:
+                        with zipfile.ZipFile(archive_path) as zip_file:
+                            paths.sync_zip(zip_file, where)
+                    except zipfile.BadZipfile:
+                        # Remove corrupt archives so they are downloaded again
+                        os.remove(archive_path)
+                        raise
+
+                    if archive_path == download_path:
+                        os.remove(archive_path)
 
             module = Module(where)
             progress_bar.update(
@@ -213,6 +489,26 @@ class ShotgunRepo(Repo):
 
         return module
 
+    def _sync_remote_archive(self, url, where, progress_cb=None):
+        """Update a previously downloaded module by reading only the changed
+        members of a remote archive using Range requests.
+
+        Returns:
+            False when the server does not support Range requests.
+        """
+
+        from .. import http
+
+        range_file = http.RangeFile.open(url, progress_cb=progress_cb)
+        if not range_file:
+            return False
+
+        with range_file:
+            with zipfile.ZipFile(range_file) as zip_file:
+                paths.sync_zip(zip_file, where)
+
+        return True
+
     def upload(self, module, overwrite=False):
         from .. import api
 
@@ -227,12 +523,12 @@ class ShotgunRepo(Repo):
             else:
                 raise Exception("Module already uploaded.")
 
-        # Get module folder info
-        folder_info = paths.get_folder_info(module.path)
+        # Scan the module once for progress reporting, size checks and zipping
+        manifest = paths.FolderManifest.from_folder(module.path)
         reporter = get_reporter()
         progress_bar = reporter.progress_bar(
             label="Upload %s" % module.name,
-            max_size=folder_info["file_count"] + 3,
+            max_size=manifest.file_count + 3,
             data={"module": module, "unit": "iT", "to_repo": self},
         )
 
@@ -241,12 +537,12 @@ class ShotgunRepo(Repo):
             archive = api.get_cache_path("tmp", module.qual_name + ".zip")
 
             # Check folder size before zipping.
-            if not self.supports_large_modules and folder_info["size"] >= 2147483647:
-                nice_size = paths.format_size(folder_info["size"])
+            if not self.supports_large_modules and manifest.size >= 2147483647:
+                nice_size = paths.format_size(manifest.size)
                 raise UploadError(MODULE_SIZE_UNSUPPORTED.format(nice_size))
 
-            # Create zip of module using folder_info.
-            paths.zip_folder_from_info(folder_info, archive, progress_bar.update)
+            # Create zip of module using the manifest.
+            paths.zip_manifest(manifest, archive, progress_bar.update)
 
             # Check actual byte size of zip archive.
             raw_archive_size = os.path.getsize(archive)
@@ -425,6 +721,26 @@ class ShotgunRepo(Repo):
         )
 
 
+class LockedApi(object):
+    """Wraps a shotgun_api3.Shotgun instance making each method call while
+    holding a lock."""
+
+    def __init__(self, api, lock):
+        self._api = api
+        self._lock = lock
+
+    def __getattr__(self, attr):
+        value = getattr(self._api, attr)
+        if not callable(value):
+            return value
+
+        def call_with_lock(*args, **kwargs):
+            with self._lock:
+                return value(*args, **kwargs)
+
+        return call_with_lock
+
+
 def entity_to_module_spec(entity, repo):
     """Convert entity data to a ModuleSpec."""
 
@@ -2,18 +2,27 @@
 
 # Standard library imports
 import contextlib
+import hashlib
+import json
 import os
 import shlex
+import sys
+import threading
+import uuid
 
 # Local imports
-from . import mappings, paths
+from . import compat, mappings, paths
 from .module import Module, best_match, is_exact_match, is_module
-from .reporter import get_reporter
+from .reporter import QueuedReporter, get_reporter, thread_reporter
 from .repos import LocalRepo
 from .vendor.fasteners import InterProcessLock
 
+# Number of environment snapshots kept when CPENV_SNAPSHOT_CACHE_SIZE is unset
+default_max_snapshots = 256
+
 __all__ = [
     "ResolveError",
+    "StaleLockError",
     "Resolver",
     "Activator",
     "Copier",
@@ -29,6 +38,10 @@ class ResolveError(Exception):
     """Raised when a Resolver fairs to resolve a module or list of modules."""
 
 
+class StaleLockError(ResolveError):
+    """Raised when a lock refers to modules that changed or no longer exist."""
+
+
 class Resolver(object):
     """Responsible for resolving ModuleSpecs from requirement strings.
 
@@ -66,21 +79,32 @@ class Resolver(object):
         # Try the old resolution alogirthm for backwards compatability
         resolved.extend(old_resolve_algorithm(self, unresolved))
 
+        # Query each repo once for all requirements. Requirements with an
+        # exact match are not passed on to lower priority repos.
+        matches = {requirement: [] for requirement in unresolved}
+        pending = list(unresolved)
+        for repo in self.repos:
+            if not pending:
+                break
+
+            for requirement, module_specs in repo.find_many(pending).items():
+                matches[requirement].extend(module_specs)
+
+            pending = [
+                requirement
+                for requirement in pending
+                if not any(is_exact_match(requirement, m) for m in matches[requirement])
+            ]
+
         for requirement in list(unresolved):
             self.reporter.find_requirement(requirement)
             # TODO: handle more complex requirements.
             #       possibly use the new resolvelib being developed by pypa
 
-            match_gen = (
-                module_spec
-                for repo in self.repos
-                for module_spec in repo.find(requirement)
-            )
-
             # best_match returns the first ModuleSpec that matches
             # both name and version or the ModuleSpec with the
             # highest version > the required version
-            match = best_match(requirement, match_gen)
+            match = best_match(requirement, matches[requirement])
             if match:
                 self.reporter.resolve_requirement(requirement, match)
                 unresolved.remove(requirement)
@@ -105,8 +129,19 @@ class Activator(object):
         self.localizer = localizer or Localizer(to_repo="home")
 
     def combine_modules(self, modules):
-        """Combine a list of module's environments."""
-        return mappings.join_dicts(*[obj.environment for obj in modules])
+        """Combine a list of module's environments.
+
+        The combined environment is stored in a snapshot keyed by the current
+        platform, python version and the path and module.yml stats of each
+        module. So, a snapshot is only reused until a module.yml changes.
+        """
+
+        snapshot_path = get_snapshot_path(modules)
+        env = read_snapshot(snapshot_path)
+        if env is None:
+            env = mappings.join_dicts(*[obj.environment for obj in modules])
+            write_snapshot(snapshot_path, env)
+        return env
 
     def activate(self, module_specs):
         """Activate a list of module specs."""
@@ -189,9 +224,14 @@ class Localizer(object):
     This is similar to a copy operation, but skips all module_specs that are
     already in LocalRepos. If they are in LocalRepos then they are already
     available to be activated.
+
+    Arguments:
+        to_repo (str or LocalRepo): Repo to localize modules to.
+        max_workers (int): Number of modules to localize concurrently.
+            Defaults to $CPENV_LOCALIZE_WORKERS or 1.
     """
 
-    def __init__(self, to_repo="home"):
+    def __init__(self, to_repo="home", max_workers=None):
         from .api import get_repo
 
         self.to_repo = get_repo(to_repo)
@@ -200,50 +240,107 @@ class Localizer(object):
         if not isinstance(self.to_repo, LocalRepo):
             raise ValueError("Localizer expected LocalRepo got %s" % type(to_repo))
 
+        if max_workers is None:
+            max_workers = localize_workers()
+        self.max_workers = max(1, max_workers)
+
     def _resolve_local_module(self, module_spec, overwrite=False):
         """Resolves the module_spec as a Module object in a LocalRepo if one exists."""
 
         # Check if module is already in a LocalRepo
         if module_spec.repo.type_name == "local":
-            return Module(module_spec.path)
+            return Module.from_spec(module_spec)
 
         # Check if module exists in to_repo
         matches = self.to_repo.find(module_spec.qual_name)
         for match in matches:
             if is_exact_match(module_spec.qual_name, match) and not overwrite:
-                return Module(match.path)
+                return Module.from_spec(match)
 
-    def localize(self, module_specs, overwrite=False):
-        """Given ModuleSpecs, download them to this Localizers repo."""
+    def _localize_module(self, module_spec, overwrite, reporter):
+        """Localize a single module_spec returning a Module."""
 
-        self.reporter.start_localize(module_specs)
-        localized = []
-        for module_spec in module_specs:
-            self.reporter.localize_module(module_spec, None)
+        reporter.localize_module(module_spec, None)
 
-            with ModuleInterProcessLock(self.to_repo, module_spec):
+        # Modules are downloaded to a staging folder and renamed into place,
+        # so a module that resolves locally is complete and needs no lock.
+        module = self._resolve_local_module(module_spec, overwrite)
+        if module:
+            return module
 
-                # Resolve the module_spec in a LocalRepo if possible. Any repo will do.
-                module = self._resolve_local_module(module_spec, overwrite)
-                if module:
-                    localized.append(module)
-                    continue
+        # Only one writer localizes a module at a time. Others wait for it to
+        # finish and then resolve the localized module.
+        with ModuleInterProcessLock(self.to_repo, module_spec, required=True):
 
-                # Generate a new module path in to_repo
-                if self.to_repo.nested:
-                    new_module_path = self.to_repo.relative_path(
-                        module_spec.name,
-                        module_spec.version.string,
-                    )
-                else:
-                    new_module_path = self.to_repo.relative_path(module_spec.qual_name)
+            # Resolve the module_spec in a LocalRepo if possible. Any repo will do.
+            module = self._resolve_local_module(module_spec, overwrite)
+            if module:
+                return module
 
-                module = module_spec.repo.download(
-                    module_spec,
-                    where=new_module_path,
-                    overwrite=overwrite,
+            # Generate a new module path in to_repo
+            if self.to_repo.nested:
+                new_module_path = self.to_repo.relative_path(
+                    module_spec.name,
+                    module_spec.version.string,
                 )
-                localized.append(module)
+            else:
+                new_module_path = self.to_repo.relative_path(module_spec.qual_name)
+
+            return module_spec.repo.download(
+                module_spec,
+                where=new_module_path,
+                overwrite=overwrite,
+            )
+
+    def _localize_worker(self, module_spec, overwrite, reporter):
+        """Localize a module_spec on a worker thread that reports to reporter."""
+
+        with thread_reporter(reporter):
+            return self._localize_module(module_spec, overwrite, reporter)
+
+    def _localize_concurrently(self, module_specs, overwrite):
+        """Localize module_specs on a pool of worker threads.
+
+        Reports made by the workers are queued and forwarded to this
+        Localizer's reporter from this thread.
+        """
+
+        from multiprocessing.pool import ThreadPool
+
+        queued_reporter = QueuedReporter(self.reporter)
+        pool = ThreadPool(min(self.max_workers, len(module_specs)))
+        try:
+            results = [
+                pool.apply_async(
+                    self._localize_worker,
+                    (module_spec, overwrite, queued_reporter),
+                )
+                for module_spec in module_specs
+            ]
+            pool.close()
+            while not all([result.ready() for result in results]):
+                queued_reporter.dispatch(timeout=0.05)
+            queued_reporter.dispatch()
+
+            # Returns modules in the same order as module_specs and raises
+            # the first exception encountered by a worker.
+            return [result.get() for result in results]
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def localize(self, module_specs, overwrite=False):
+        """Given ModuleSpecs, download them to this Localizers repo."""
+
+        self.reporter.start_localize(module_specs)
+
+        if self.max_workers > 1 and len(module_specs) > 1:
+            localized = self._localize_concurrently(module_specs, overwrite)
+        else:
+            localized = [
+                self._localize_module(module_spec, overwrite, self.reporter)
+                for module_spec in module_specs
+            ]
 
         self.reporter.end_localize(localized)
 
@@ -253,6 +350,97 @@ class Localizer(object):
         return localized
 
 
+def get_snapshot_path(modules):
+    """Get the path to the environment snapshot of a list of modules."""
+
+    from .api import get_cache_path
+
+    key = [compat.platform, sys.version[:3]]
+    for module in modules:
+        try:
+            config_stat = os.stat(module.config_path)
+            key.append([module.path, config_stat.st_size, config_stat.st_mtime])
+        except OSError:
+            key.append([module.path, None, None])
+
+    digest = hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()
+    return get_cache_path("snapshots", digest + ".json")
+
+
+def read_snapshot(snapshot_path):
+    """Read an environment snapshot. Returns None if it does not exist."""
+
+    try:
+        with open(snapshot_path, "r") as f:
+            env = json.load(f)
+        # Bump mtime so eviction removes the least recently used snapshots
+        os.utime(snapshot_path, None)
+        return env
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def write_snapshot(snapshot_path, env):
+    """Write an environment snapshot. Fails silently as snapshots are only an
+    optimization.
+
+    Least recently used snapshots are removed once there are more than
+    $CPENV_SNAPSHOT_CACHE_SIZE snapshots.
+    """
+
+    tmp_path = snapshot_path + "." + uuid.uuid4().hex[:8]
+    try:
+        paths.ensure_path_exists(os.path.dirname(snapshot_path))
+        with open(tmp_path, "w") as f:
+            json.dump(env, f, separators=(",", ":"))
+        paths.replace(tmp_path, snapshot_path)
+        evict_snapshots(os.path.dirname(snapshot_path), max_snapshots())
+    except (IOError, OSError, TypeError, ValueError):
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
+
+
+def evict_snapshots(root, max_count):
+    """Remove the least recently used snapshots in root until at most
+    max_count remain."""
+
+    snapshots = []
+    for name in os.listdir(root):
+        if not name.endswith(".json"):
+            continue
+        snapshot_path = paths.normalize(root, name)
+        try:
+            snapshots.append((os.stat(snapshot_path).st_mtime, snapshot_path))
+        except OSError:
+            continue
+
+    for _, snapshot_path in sorted(snapshots)[: max(0, len(snapshots) - max_count)]:
+        try:
+            os.remove(snapshot_path)
+        except OSError:
+            # Snapshot may be in use on windows
+            pass
+
+
+def max_snapshots():
+    """Maximum number of environment snapshots to keep from
+    $CPENV_SNAPSHOT_CACHE_SIZE."""
+
+    try:
+        return int(os.getenv("CPENV_SNAPSHOT_CACHE_SIZE", default_max_snapshots))
+    except ValueError:
+        return default_max_snapshots
+
+
+def localize_workers():
+    """Number of modules to localize concurrently from $CPENV_LOCALIZE_WORKERS."""
+
+    try:
+        return int(os.getenv("CPENV_LOCALIZE_WORKERS", 1))
+    except ValueError:
+        return 1
+
+
 def lock_required(repo):
     """Check if locks are enabled..."""
     try:
@@ -261,16 +449,31 @@ def lock_required(repo):
         return 0
 
 
+_thread_locks = {}
+_thread_locks_lock = threading.Lock()
+
+
+def _get_thread_lock(lock_file):
+    """Get a threading.Lock for a lock file. File locks are held per process so
+    threads in this process need their own lock."""
+
+    with _thread_locks_lock:
+        return _thread_locks.setdefault(lock_file, threading.Lock())
+
+
 @contextlib.contextmanager
-def ModuleInterProcessLock(repo, module_spec):
+def ModuleInterProcessLock(repo, module_spec, required=None):
+
+    if required is None:
+        required = lock_required(repo)
 
     # We can only create locks in LocalRepos
-    if lock_required(repo):
+    if required and isinstance(repo, LocalRepo):
 
         # Acquire a lock for the module_spec so other processes / users
         # pointing at the same to_repo location do not step on each others toes.
         lock_file = repo.relative_path(".locks", module_spec.qual_name + ".lock")
-        with InterProcessLock(lock_file) as lock:
+        with _get_thread_lock(lock_file), InterProcessLock(lock_file) as lock:
 
             # Clear the LocalRepo cache in case a Module was created while acquiring
             # the lock.
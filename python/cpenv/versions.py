@@ -62,44 +62,34 @@ class Version(VersionBase):
     def __hash__(self):
         return super(Version, self).__hash__()
 
-    def _comparable_value(self, value, other):
-        """Return a value that will be comparable with other."""
-
-        types_match = type(value) is type(other)
-        if types_match or isinstance(value, compat.numeric_types):
-            return value
-
-        if other is None:
-            return value
-
-        if value is None and isinstance(other, compat.string_types):
-            return "zzzzzzzz"
-
-        if isinstance(other, compat.numeric_types):
-            return -float("inf")
-
-        return value
-
-    def _comparable(self, other):
-        """Generate a comparison key for a Version object.
-
-        Coerces types of prerelease and buildmeta to ensure that the Version
-        objects are comparable. This is required because Python 3 now raises
-        a TypeError when attempting to compare str and int.
+    @property
+    def sort_key(self):
+        """A key ordering Versions like their comparison operators.
+
+        Computed once per Version. Prerelease and buildmetadata values are
+        ranked so that strings sort before None and None sorts before
+        numbers. None ranks as the string "zzzzzzzz" to match how Versions
+        have always compared.
         """
-        return (
-            self.major,
-            self.minor,
-            self.patch,
-            self._comparable_value(self.prerelease, other.prerelease),
-            self._comparable_value(self.buildmetadata, other.buildmetadata),
-        )
+
+        try:
+            return self.__dict__["_sort_key"]
+        except KeyError:
+            key = (
+                self.major,
+                self.minor,
+                self.patch,
+                _sort_key_value(self.prerelease),
+                _sort_key_value(self.buildmetadata),
+            )
+            self.__dict__["_sort_key"] = key
+            return key
 
     def __lt__(self, other):
         if not isinstance(other, Version):
             raise ValueError("Can only compare two Version objects.")
 
-        return self._comparable(other) < other._comparable(self)
+        return self.sort_key < other.sort_key
 
     def __eq__(self, other):
         if not isinstance(other, Version):
@@ -108,10 +98,74 @@ class Version(VersionBase):
         return tuple(other) == tuple(self)
 
 
+def _sort_key_value(value):
+    if isinstance(value, compat.numeric_types):
+        return (1, value)
+    if value is None:
+        return (0, "zzzzzzzz")
+    return (0, value)
+
+
 class ParseError(Exception):
     """Raised when a parse method fails."""
 
 
+def _nuke_version(match):
+    return Version(
+        major=int(match.group("major")),
+        minor=int(match.group("minor")),
+        patch=int(match.group("patch")),
+        prerelease=None,
+        buildmetadata=None,
+        string=match.group(0),
+    )
+
+
+def _four_version(match):
+    return Version(
+        major=int(match.group("major")),
+        minor=int(match.group("minor")),
+        patch=int(match.group("revision")),
+        prerelease=int(match.group("build")),
+        buildmetadata=match.group("buildmetadata"),
+        string=match.group(0),
+    )
+
+
+def _semver_version(match):
+    return Version(
+        major=int(match.group("major")),
+        minor=int(match.group("minor")),
+        patch=int(match.group("patch")),
+        prerelease=match.group("prerelease"),
+        buildmetadata=match.group("buildmetadata"),
+        string=match.group(0),
+    )
+
+
+def _simple_version(match):
+    kwargs = dict(Version._defaults)
+    kwargs["string"] = match.group(0)
+    version_parts = match.group("version").split(".")
+    for part, part_name in zip(version_parts, ["major", "minor", "patch"]):
+        kwargs[part_name] = int(part)
+    return Version(**kwargs)
+
+
+# Compiled patterns tried in order by parse_version
+version_parsers = [
+    (re.compile(nuke_version_pattern), _nuke_version),
+    (re.compile(four_version_pattern), _four_version),
+    (re.compile(semver_version_pattern), _semver_version),
+    (re.compile(simplever_pattern), _simple_version),
+]
+
+
+# Parsed Versions by string, cleared when it reaches max_cached_versions
+_version_cache = {}
+max_cached_versions = 4096
+
+
 def parse_version(string):
     """Parse and return a Version from the provided string.
 
@@ -119,6 +173,8 @@ def parse_version(string):
       - semver / calver
       - simple versions like: 10, v2, 1.0, 2.2.4
 
+    Results are cached as Versions are immutable.
+
     Arguments:
         string (str): String to parse version from.
 
@@ -128,53 +184,24 @@ def parse_version(string):
     Raises:
         ParseError when a version can not be parsed.
     """
-    # Parse weird nuke versioning
-    match = re.search(nuke_version_pattern, string)
-    if match:
-        return Version(
-            major=int(match.group("major")),
-            minor=int(match.group("minor")),
-            patch=int(match.group("patch")),
-            prerelease=None,
-            buildmetadata=None,
-            string=match.group(0),
-        )
-
-    # Parse four_version - four digit version
-    match = re.search(four_version_pattern, string)
-    if match:
-        return Version(
-            major=int(match.group("major")),
-            minor=int(match.group("minor")),
-            patch=int(match.group("revision")),
-            prerelease=int(match.group("build")),
-            buildmetadata=match.group("buildmetadata"),
-            string=match.group(0),
-        )
-
-    # Parse Semver / Calver
-    match = re.search(semver_version_pattern, string)
-    if match:
-        return Version(
-            major=int(match.group("major")),
-            minor=int(match.group("minor")),
-            patch=int(match.group("patch")),
-            prerelease=match.group("prerelease"),
-            buildmetadata=match.group("buildmetadata"),
-            string=match.group(0),
-        )
-
-    # Parse Simple version
-    match = re.search(simplever_pattern, string)
-    if match:
-        kwargs = dict(Version._defaults)
-        kwargs["string"] = match.group(0)
-        version_parts = match.group("version").split(".")
-        for part, part_name in zip(version_parts, ["major", "minor", "patch"]):
-            kwargs[part_name] = int(part)
-        return Version(**kwargs)
-
-    raise ParseError("Could not parse version from %s" % string)
+
+    try:
+        return _version_cache[string]
+    except KeyError:
+        pass
+
+    for pattern, make_version in version_parsers:
+        match = pattern.search(string)
+        if match:
+            version = make_version(match)
+            break
+    else:
+        raise ParseError("Could not parse version from %s" % string)
+
+    if len(_version_cache) >= max_cached_versions:
+        _version_cache.clear()
+    _version_cache[string] = version
+    return version
 
 
 def default_version():
@@ -7,7 +7,6 @@ import traceback
 # Standard library imports
 from collections import OrderedDict
 from functools import partial
-from string import Template
 
 # Shotgun imports
 import sgtk
@@ -450,7 +449,7 @@ class ModuleSelector(QtGui.QWidget):
             # 2. Dump to string
             module_env = yaml.safe_dump(module_env)
             # 3. Substitute config variables
-            module_env = Template(module_env).safe_substitute(config_vars)
+            module_env = mappings.substitute(module_env, config_vars)
             # 4. Load as dict
             module_env = yaml.safe_load(module_env)
             module_envs.append(module_env)
@@ -680,6 +679,18 @@ class ModuleSelector(QtGui.QWidget):
             )
             error_message.exec_()
             app.execption(message)
+            return
+
+        # Lock the selected modules so launching skips module resolution
+        module_specs = [s.selection for s in self.state['selected'].values()]
+        if any(spec.repo is None for spec in module_specs):
+            app.debug('Not locking %s, some modules are missing.' % env['code'])
+            return
+
+        try:
+            app.io.write_environment_lock(env, app.lock(module_specs))
+        except Exception:
+            app.debug('Failed to lock %s.' % env['code'])
 
     def on_env_rename_clicked(self):
         env_names = [e['code'] for e in self.state['environments']]